@@ -1,6 +1,8 @@
+from django.db.models import F, FilteredRelation, Q
 from django_filters.rest_framework import FilterSet, filters
 
-from recipes.models import Ingredient, Recipe, Tag
+from recipes.caches import tag_catalogue
+from recipes.models import Ingredient, Recipe
 
 
 class IngredientsFilter(FilterSet):
@@ -16,10 +18,11 @@ class IngredientsFilter(FilterSet):
 class RecipesFilter(FilterSet):
     """ Фильтр рецептов."""
 
-    tags = filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        to_field_name='slug',
-        queryset=Tag.objects.all(),
+    tags = filters.MultipleChoiceFilter(
+        choices=lambda: [
+            (slug, slug) for slug in tag_catalogue.refresh().by_slug
+        ],
+        method='filter_tags'
     )
     is_favorited = filters.BooleanFilter(
         method='selected'
@@ -27,6 +30,10 @@ class RecipesFilter(FilterSet):
     is_in_shopping_cart = filters.BooleanFilter(
         method='cart'
     )
+    ordering = filters.ChoiceFilter(
+        choices=(('trending', 'популярные'), ('views', 'просмотры')),
+        method='order'
+    )
 
     class Meta:
         model = Recipe
@@ -35,6 +42,16 @@ class RecipesFilter(FilterSet):
             'author',
         )
 
+    def filter_tags(self, queryset, name, value):
+        """ Фильтр по тегам через id из кеша, без join с Tag."""
+
+        if not value:
+            return queryset
+        by_slug = tag_catalogue.refresh().by_slug
+        return queryset.filter(
+            recipetotag__tag_id__in=[by_slug[slug]['id'] for slug in value]
+        ).distinct()
+
     def selected(self, queryset, name, value):
         """ Фильтр избранного."""
 
@@ -50,3 +67,33 @@ class RecipesFilter(FilterSet):
         if value and not user.is_anonymous:
             return queryset.filter(listrecipe__user=user)
         return queryset
+
+    def order(self, queryset, name, value):
+        """ Сортировка по просмотрам или рейтингу популярности.
+
+        Для рейтинга с одним тегом в запросе берется рейтинг внутри
+        этого тега. Рецепты без рейтинга идут в конце, а не пропадают.
+        """
+
+        if value == 'views':
+            return queryset.order_by(
+                F('stats__views').desc(nulls_last=True),
+                '-id'
+            )
+        tags = self.form.cleaned_data.get('tags')
+        tag = (
+            tag_catalogue.refresh().by_slug[tags[0]]['id']
+            if tags and len(tags) == 1 else None
+        )
+        return queryset.annotate(
+            rank=FilteredRelation(
+                'ranks',
+                condition=(
+                    Q(ranks__tag__isnull=True) if tag is None
+                    else Q(ranks__tag_id=tag)
+                )
+            )
+        ).order_by(
+            F('rank__score').desc(nulls_last=True),
+            '-id'
+        )
@@ -0,0 +1,54 @@
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+from django.conf import settings
+from django.contrib.auth.hashers import get_hashers
+from django.core.management import BaseCommand
+
+from users.hashers import HashingBusy
+
+PASSWORD = 'bench-password-123'
+
+
+class Command(BaseCommand):
+    """ Скорость проверки пароля для каждого хешера из настроек."""
+
+    help = ('проверок пароля в секунду на ядро и в несколько потоков '
+            'с ограничением HASHING_CONCURRENCY')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument(
+            '--threads', type=int, default=settings.HASHING_CONCURRENCY * 4
+        )
+
+    @staticmethod
+    def login(hasher, encoded):
+        try:
+            return hasher.verify(PASSWORD, encoded)
+        except HashingBusy:
+            return False
+
+    def rate(self, hasher, encoded, repeat, threads):
+        """ Успешных проверок в секунду и число отказов по лимиту."""
+
+        started = perf_counter()
+        with ThreadPoolExecutor(threads) as pool:
+            results = list(pool.map(
+                lambda _: self.login(hasher, encoded),
+                range(repeat * threads)
+            ))
+        return sum(results) / (perf_counter() - started), results.count(False)
+
+    def handle(self, *args, **options):
+        repeat, threads = options['repeat'], options['threads']
+        for hasher in get_hashers():
+            encoded = hasher.encode(PASSWORD, hasher.salt())
+            single, _ = self.rate(hasher, encoded, repeat, 1)
+            parallel, rejected = self.rate(hasher, encoded, repeat, threads)
+            self.stdout.write(
+                f'{hasher.algorithm}: {single:.1f} входов/с на ядро, '
+                f'{threads} потоков: {parallel:.1f} входов/с, '
+                f'{rejected} отказов (не больше '
+                f'{settings.HASHING_CONCURRENCY} хешей сразу)'
+            )
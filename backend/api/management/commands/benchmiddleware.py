@@ -0,0 +1,51 @@
+from statistics import median
+from time import perf_counter
+
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.test import Client, override_settings
+from django.utils.module_loading import import_string
+
+from backend.middleware import SkipAPIMixin
+
+
+def full_stack():
+    """ MIDDLEWARE с исходными классами Django вместо облегченных."""
+
+    stack = []
+    for path in settings.MIDDLEWARE:
+        middleware = import_string(path)
+        if issubclass(middleware, SkipAPIMixin):
+            base = middleware.__bases__[1]
+            path = f'{base.__module__}.{base.__name__}'
+        stack.append(path)
+    return stack
+
+
+class Command(BaseCommand):
+    """ Сравнение полного и облегченного набора middleware."""
+
+    help = 'время запроса к API через полный и облегченный MIDDLEWARE'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='/api/tags/')
+        parser.add_argument('--repeat', type=int, default=2000)
+
+    def measure(self, middleware, url, repeat):
+        with override_settings(MIDDLEWARE=middleware):
+            client = Client()
+            client.get(url)
+            timings = []
+            for _ in range(repeat):
+                started = perf_counter()
+                client.get(url)
+                timings.append(perf_counter() - started)
+        return median(timings) * 1e6
+
+    def handle(self, *args, **options):
+        url, repeat = options['url'], options['repeat']
+        full = self.measure(full_stack(), url, repeat)
+        lean = self.measure(settings.MIDDLEWARE, url, repeat)
+        self.stdout.write(f'{url}: полный {full:.0f} мкс, '
+                          f'облегченный {lean:.0f} мкс, '
+                          f'экономия {full - lean:.0f} мкс на запрос')
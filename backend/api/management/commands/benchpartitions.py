@@ -0,0 +1,130 @@
+import random
+from statistics import median
+from time import perf_counter
+
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+
+LAYOUTS = ('bench_links_plain', 'bench_links_hash')
+LOAD_CHUNK = 1_000_000
+
+
+class Command(BaseCommand):
+    """ Сравнение обычной и секционированной по user_id таблицы связей.
+
+    Таблицы с той же схемой, что у избранного и корзины, создаются
+    рядом с рабочими и удаляются после замера.
+    """
+
+    help = ('вставка, поиск и VACUUM в обычной и хеш-секционированной '
+            'таблице связей (только Postgres)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000)
+        parser.add_argument('--users', type=int, default=100_000)
+        parser.add_argument('--partitions', type=int, default=16)
+        parser.add_argument('--repeat', type=int, default=1000)
+
+    def create(self, cursor, table, partitions):
+        hashed = table.endswith('hash')
+        cursor.execute(
+            f'CREATE TABLE {table} (id bigserial, user_id bigint NOT NULL, '
+            f'recipe_id bigint NOT NULL, created timestamptz NOT NULL '
+            f'DEFAULT now()) '
+            + ('PARTITION BY HASH (user_id)' if hashed else '')
+        )
+        for remainder in range(partitions if hashed else 0):
+            cursor.execute(
+                f'CREATE TABLE {table}_p{remainder} PARTITION OF {table} '
+                f'FOR VALUES WITH (MODULUS {partitions}, '
+                f'REMAINDER {remainder})'
+            )
+        cursor.execute(
+            f'ALTER TABLE {table} ADD PRIMARY KEY '
+            + ('(id, user_id)' if hashed else '(id)')
+        )
+        cursor.execute(f'ALTER TABLE {table} ADD UNIQUE (user_id, recipe_id)')
+        cursor.execute(f'CREATE INDEX ON {table} (recipe_id)')
+        cursor.execute(f'CREATE INDEX ON {table} (created)')
+
+    def load(self, cursor, table, rows, users):
+        started = perf_counter()
+        for start in range(0, rows, LOAD_CHUNK):
+            cursor.execute(
+                f'INSERT INTO {table} (user_id, recipe_id) '
+                f'SELECT n %% %s, n / %s FROM generate_series(%s, %s) AS n',
+                [users, users, start, min(start + LOAD_CHUNK, rows) - 1]
+            )
+        cursor.execute(f'ANALYZE {table}')
+        return perf_counter() - started
+
+    def timed(self, cursor, query, arguments):
+        timings = []
+        for params in arguments:
+            started = perf_counter()
+            cursor.execute(query, params)
+            if cursor.description:
+                cursor.fetchall()
+            timings.append(perf_counter() - started)
+        return median(timings) * 1e6
+
+    def size(self, cursor, table):
+        cursor.execute(
+            'SELECT SUM(pg_total_relation_size(oid)) FROM pg_class '
+            'WHERE oid = %s::regclass OR oid IN (SELECT inhrelid '
+            'FROM pg_inherits WHERE inhparent = %s::regclass)',
+            [table, table]
+        )
+        return cursor.fetchone()[0] / 2 ** 20
+
+    def vacuum(self, cursor, table):
+        cursor.execute(f'DELETE FROM {table} WHERE mod(id, 100) = 0')
+        started = perf_counter()
+        cursor.execute(f'VACUUM {table}')
+        return perf_counter() - started
+
+    def measure(self, cursor, table, options):
+        rows, users, repeat = (
+            options['rows'], options['users'], options['repeat']
+        )
+        self.create(cursor, table, options['partitions'])
+        load = self.load(cursor, table, rows, users)
+        random.seed(0)
+        fresh = rows // users + 1
+        insert = self.timed(
+            cursor,
+            f'INSERT INTO {table} (user_id, recipe_id) VALUES (%s, %s)',
+            [(random.randrange(users), fresh + number)
+             for number in range(repeat)]
+        )
+        exists = self.timed(
+            cursor,
+            f'SELECT EXISTS (SELECT 1 FROM {table} '
+            f'WHERE user_id = %s AND recipe_id = %s)',
+            [(random.randrange(users), random.randrange(fresh))
+             for _ in range(repeat)]
+        )
+        listing = self.timed(
+            cursor,
+            f'SELECT recipe_id FROM {table} WHERE user_id = %s '
+            f'ORDER BY id DESC LIMIT 6',
+            [(random.randrange(users),) for _ in range(repeat)]
+        )
+        size = self.size(cursor, table)
+        vacuum = self.vacuum(cursor, table)
+        self.stdout.write(
+            f'{table}: загрузка {load:.1f} с, вставка {insert:.0f} мкс, '
+            f'поиск {exists:.0f} мкс, список {listing:.0f} мкс, '
+            f'VACUUM {vacuum:.1f} с, размер {size:.0f} МБ'
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('замер доступен только в Postgres')
+        with connection.cursor() as cursor:
+            try:
+                for table in LAYOUTS:
+                    self.measure(cursor, table, options)
+            finally:
+                for table in LAYOUTS:
+                    cursor.execute(f'DROP TABLE IF EXISTS {table}')
@@ -0,0 +1,75 @@
+from timeit import timeit
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management import BaseCommand
+from django.db.models import Prefetch
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.serializers import RecipesFastListSerializer, RecipesListSerializer
+from recipes.models import IngredientToRecipe, Recipe
+from users.models import User
+
+
+class Command(BaseCommand):
+    """ Сравнение сериализаторов ленты рецептов."""
+
+    help = 'замер скорости RecipesListSerializer и облегченного сериализатора'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=10)
+        parser.add_argument('--email', help='юзер, от имени которого запрос')
+
+    def handle(self, *args, **options):
+        limit = options['limit']
+        repeat = options['repeat']
+        request = Request(APIRequestFactory().get('/api/recipes/'))
+        request.user = (
+            User.objects.get(email=options['email'])
+            if options['email'] else AnonymousUser()
+        )
+        context = {'request': request}
+
+        def prefetched():
+            return list(
+                Recipe.objects.select_related('author').prefetch_related(
+                    'tags',
+                    Prefetch(
+                        'recipe',
+                        queryset=IngredientToRecipe.objects.select_related(
+                            'ingredient'
+                        )
+                    )
+                )[:limit]
+            )
+
+        def current():
+            RecipesListSerializer(
+                Recipe.objects.all()[:limit], many=True, context=context
+            ).data
+
+        def current_prefetched():
+            RecipesListSerializer(
+                prefetched(), many=True, context=context
+            ).data
+
+        def fast():
+            request._request.__dict__.pop('_user_marks', None)
+            RecipesFastListSerializer(
+                Recipe.objects.all()[:limit], many=True, context=context
+            ).data
+
+        timings = (
+            ('RecipesListSerializer', current),
+            ('RecipesListSerializer + prefetch', current_prefetched),
+            ('RecipesFastListSerializer', fast),
+        )
+        baseline = None
+        for title, func in timings:
+            elapsed = timeit(func, number=repeat) / repeat
+            baseline = baseline or elapsed
+            self.stdout.write(
+                f'{title}: {elapsed * 1000:.1f} мс '
+                f'(x{baseline / elapsed:.1f})'
+            )
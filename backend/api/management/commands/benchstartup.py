@@ -0,0 +1,81 @@
+import json
+import os
+import subprocess
+import sys
+from statistics import median
+
+from django.core.management import BaseCommand
+
+PROBE = '''
+import gc, json, os, resource, sys, time
+started = time.perf_counter()
+from backend.wsgi import application
+loaded = time.perf_counter()
+from django.urls import get_resolver
+get_resolver().url_patterns
+routed = time.perf_counter()
+if sys.argv[1] == 'freeze':
+    gc.collect()
+    gc.freeze()
+
+
+def private_kb():
+    try:
+        with open('/proc/self/smaps_rollup') as smaps:
+            return sum(
+                int(line.split()[1]) for line in smaps
+                if line.startswith(('Private_Clean', 'Private_Dirty'))
+            )
+    except OSError:
+        return None
+
+
+read, write = os.pipe()
+if os.fork() == 0:
+    gc.collect()
+    os.write(write, json.dumps(private_kb()).encode())
+    os._exit(0)
+os.wait()
+worker = json.loads(os.read(read, 64))
+print(json.dumps({
+    'wsgi': (loaded - started) * 1000,
+    'urls': (routed - loaded) * 1000,
+    'rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    'worker': worker,
+    'modules': len(sys.modules),
+}))
+'''
+
+
+class Command(BaseCommand):
+    """ Замер холодного старта: импорт wsgi, URLconf и память воркера."""
+
+    help = 'время импорта backend.wsgi и память процесса после fork'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def probe(self, freeze, env):
+        output = subprocess.run(
+            [sys.executable, '-c', PROBE, 'freeze' if freeze else 'plain'],
+            env=env, check=True, capture_output=True, text=True
+        ).stdout
+        return json.loads(output.strip().splitlines()[-1])
+
+    def handle(self, *args, **options):
+        for admin in ('True', 'False'):
+            env = {**os.environ, 'ADMIN_ENABLED': admin}
+            for freeze in (False, True):
+                runs = [
+                    self.probe(freeze, env) for _ in range(options['repeat'])
+                ]
+                worker = runs[-1]['worker']
+                self.stdout.write(
+                    f'admin={admin:<5} freeze={freeze!s:<5} '
+                    f'wsgi {median(r["wsgi"] for r in runs):7.1f} ms  '
+                    f'urls {median(r["urls"] for r in runs):6.1f} ms  '
+                    f'maxrss {runs[-1]["rss"] // 1024} MB  '
+                    f'worker private '
+                    f'{"-" if worker is None else worker // 1024} MB  '
+                    f'modules {runs[-1]["modules"]}'
+                )
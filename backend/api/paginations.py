@@ -1,5 +1,40 @@
-from rest_framework.pagination import PageNumberPagination
+from django.conf import settings
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import PageNumberPagination, replace_query_param
+from rest_framework.response import Response
 
 
 class LimitPagination(PageNumberPagination):
     page_size_query_param = "limit"
+
+
+class FeedPagination:
+    """ Keyset-пагинация ленты: курсор - id последнего рецепта страницы."""
+
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+    max_page_size = 100
+
+    def get_params(self, request):
+        """ Курсор и размер страницы из запроса."""
+
+        try:
+            cursor = request.query_params.get(self.cursor_query_param)
+            cursor = int(cursor) if cursor else None
+            limit = int(request.query_params.get(
+                self.page_size_query_param,
+                settings.REST_FRAMEWORK['PAGE_SIZE']
+            ))
+        except ValueError:
+            raise ValidationError({'errors': 'неверный курсор или limit.'})
+        return cursor, max(1, min(limit, self.max_page_size))
+
+    def get_paginated_response(self, request, data, next_cursor):
+        next_url = None
+        if next_cursor is not None:
+            next_url = replace_query_param(
+                request.build_absolute_uri(),
+                self.cursor_query_param,
+                next_cursor
+            )
+        return Response({'next': next_url, 'results': data})
@@ -1,16 +1,26 @@
 import base64
 
+from django.conf import settings
 from django.contrib.auth.password_validation import validate_password
 from django.core import exceptions as django_exceptions
+from django.core.cache import caches
 from django.core.files.base import ContentFile
 from django.core.validators import MinValueValidator, MaxValueValidator
-from django.shortcuts import get_object_or_404
+from django.db import connection, transaction
+from django.db.models import Prefetch, prefetch_related_objects
+from django.http import Http404
+from django.urls import reverse
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from rest_framework import exceptions, serializers
 from rest_framework.fields import SerializerMethodField
 from rest_framework.validators import UniqueValidator
 
-from recipes.models import Ingredient, IngredientToRecipe, Recipe, Tag
+from jobs.models import Job
+from recipes.caches import recipe_fragment_key, tag_catalogue
+from recipes.changes import log_changes
+from recipes.models import (ChangeLog, Ingredient, IngredientToRecipe,
+                            Recipe, RecipeToTag, Tag)
+from recipes.signals import schedule_recipe_jobs
 from users.models import Subscribe, User
 
 
@@ -171,6 +181,170 @@ class RecipesListSerializer(serializers.ModelSerializer):
         )
 
 
+def get_user_marks(request):
+    """ Id избранного, корзины и подписок текущего юзера.
+
+    Считаются один раз на запрос и кешируются на объекте запроса.
+    """
+
+    http_request = getattr(request, '_request', request)
+    marks = getattr(http_request, '_user_marks', None)
+    if marks is not None:
+        return marks
+    user = getattr(request, 'user', None)
+    if user is None or user.is_anonymous:
+        marks = (frozenset(), frozenset(), frozenset())
+    else:
+        marks = (
+            frozenset(user.select.values_list('recipe_id', flat=True)),
+            frozenset(
+                user.listingredientuser.values_list('recipe_id', flat=True)
+            ),
+            frozenset(user.subscriber.values_list('author_id', flat=True)),
+        )
+    http_request._user_marks = marks
+    return marks
+
+
+def parse_fields(value, allowed):
+    """ Разбор параметра ?fields= с сохранением порядка полей."""
+
+    if not value:
+        return allowed
+    requested = {name.strip() for name in value.split(',')}
+    requested.add('id')
+    return tuple(name for name in allowed if name in requested)
+
+
+class RecipesFastListSerializer:
+    """ Быстрая сериализация рецептов для ленты и карточки.
+
+    Независимая от юзера часть рецепта хранится в кеше фрагментом по
+    ключу (id, версия), страница собирается одним get_many. Для
+    промахов связи догружаются пачкой, флаги юзера и теги из каталога
+    подставляются при сборке. Формат ответа совпадает с
+    RecipesListSerializer.
+    """
+
+    default_fields = RecipesListSerializer.Meta.fields + ('views',)
+
+    def __init__(self, instance, many=False, context=None, fields=None):
+        self.instance = instance
+        self.many = many
+        self.context = context or {}
+        self.fields = parse_fields(fields, self.default_fields)
+
+    @staticmethod
+    def fragment(recipe):
+        """ Часть рецепта без флагов юзера, теги - списком id."""
+
+        author = recipe.author
+        return {
+            'id': recipe.id,
+            'tags': [link.tag_id for link in recipe.recipetotag_set.all()],
+            'author': {
+                'email': author.email,
+                'id': author.id,
+                'username': author.username,
+                'first_name': author.first_name,
+                'last_name': author.last_name,
+            },
+            'ingredients': [
+                {
+                    'id': item.ingredient.id,
+                    'name': item.ingredient.name,
+                    'measurement_unit': item.ingredient.measurement_unit,
+                    'amount': item.amount,
+                }
+                for item in recipe.recipe.all()
+            ],
+            'name': recipe.name,
+            'image': recipe.image.url if recipe.image else None,
+            'text': recipe.text,
+            'cooking_time': recipe.cooking_time,
+        }
+
+    def fragments(self, recipes):
+        """ Фрагменты из кеша, промахи собираются и кладутся обратно."""
+
+        keys = {recipe.id: recipe_fragment_key(recipe) for recipe in recipes}
+        fragment_cache = caches[settings.FRAGMENT_CACHE]
+        cached = fragment_cache.get_many(keys.values())
+        missing = [
+            recipe for recipe in recipes if keys[recipe.id] not in cached
+        ]
+        if missing:
+            prefetch_related_objects(
+                missing,
+                'recipetotag_set',
+                Prefetch(
+                    'recipe',
+                    queryset=IngredientToRecipe.objects.select_related(
+                        'ingredient'
+                    )
+                ),
+                'author'
+            )
+            built = {
+                keys[recipe.id]: self.fragment(recipe) for recipe in missing
+            }
+            fragment_cache.set_many(built, settings.RECIPE_FRAGMENT_TIMEOUT)
+            cached.update(built)
+        return [cached[keys[recipe.id]] for recipe in recipes]
+
+    def image_url(self, url):
+        if not url:
+            return None
+        request = self.context.get('request')
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
+
+    def to_representation(self, recipe, fragment, marks, tags):
+        """ Словарь рецепта по списку полей."""
+
+        favorites, cart, subscriptions = marks
+        data = {}
+        for name in self.fields:
+            if name == 'views':
+                data[name] = getattr(recipe, 'views', 0)
+            elif name == 'tags':
+                data[name] = sorted(
+                    (tags[pk] for pk in fragment['tags']),
+                    key=lambda tag: -tag['id']
+                )
+            elif name == 'author':
+                data[name] = {
+                    **fragment['author'],
+                    'is_subscribed': (
+                        fragment['author']['id'] in subscriptions
+                    ),
+                }
+            elif name == 'is_favorited':
+                data[name] = fragment['id'] in favorites
+            elif name == 'is_in_shopping_cart':
+                data[name] = fragment['id'] in cart
+            elif name == 'image':
+                data[name] = self.image_url(fragment['image'])
+            else:
+                data[name] = fragment[name]
+        return data
+
+    @property
+    def data(self):
+        recipes = list(self.instance) if self.many else [self.instance]
+        fragments = self.fragments(recipes)
+        tags = tag_catalogue.lookup(
+            pk for fragment in fragments for pk in fragment['tags']
+        ) if 'tags' in self.fields else {}
+        marks = get_user_marks(self.context.get('request'))
+        result = [
+            self.to_representation(recipe, fragment, marks, tags)
+            for recipe, fragment in zip(recipes, fragments)
+        ]
+        return result if self.many else result[0]
+
+
 class RecipeSendSerializer(serializers.ModelSerializer):
     author = UserListSerializer(read_only=True)
     tags = serializers.PrimaryKeyRelatedField(
@@ -241,25 +415,41 @@ class RecipeSendSerializer(serializers.ModelSerializer):
                 )
         return data
 
+    @staticmethod
+    def check_ingredients(ingredients):
+        """ Проверка существования ингридиентов одним запросом."""
+
+        ids = {item['id'] for item in ingredients}
+        if Ingredient.objects.filter(pk__in=ids).count() != len(ids):
+            raise Http404('ингридиент не найден.')
+
+    @staticmethod
+    def ingredient_links(recipe, ingredients):
+        return [
+            IngredientToRecipe(
+                recipe=recipe,
+                ingredient_id=item['id'],
+                amount=item['amount']
+            )
+            for item in ingredients
+        ]
+
+    @transaction.atomic
     def create(self, validated_data):
         """ Запись рецепта."""
 
         author = self.context.get('request').user
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
+        self.check_ingredients(ingredients)
         recipe = Recipe.objects.create(author=author, **validated_data)
         recipe.tags.set(tags)
-
-        for ingredient in ingredients:
-            amount = ingredient['amount']
-            ingredient = get_object_or_404(Ingredient, pk=ingredient['id'])
-            IngredientToRecipe.objects.create(
-                recipe=recipe,
-                ingredient=ingredient,
-                amount=amount
-            )
+        IngredientToRecipe.objects.bulk_create(
+            self.ingredient_links(recipe, ingredients)
+        )
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         """ Обновление рецепта."""
 
@@ -268,25 +458,63 @@ class RecipeSendSerializer(serializers.ModelSerializer):
             instance.tags.set(tags)
         ingredients = validated_data.pop('ingredients', None)
         if ingredients is not None:
+            self.check_ingredients(ingredients)
             instance.ingredients.clear()
-            for ingredient in ingredients:
-                amount = ingredient['amount']
-                ingredient = get_object_or_404(Ingredient, pk=ingredient['id'])
-                IngredientToRecipe.objects.update_or_create(
-                    recipe=instance,
-                    ingredient=ingredient,
-                    defaults={'amount': amount}
-                )
+            IngredientToRecipe.objects.bulk_create(
+                self.ingredient_links(instance, ingredients)
+            )
         return super().update(instance, validated_data)
 
+    @classmethod
+    def create_many(cls, items, author):
+        """ Пакетная запись проверенных рецептов.
+
+        Рецепты, теги и ингридиенты пишутся bulk-запросами, ингридиенты
+        должны быть проверены заранее. Без id из bulk_create рецепты
+        пишутся save(), журнал и задачи тогда ставят сигналы.
+        """
+
+        recipes = [
+            Recipe(
+                author=author,
+                **{
+                    name: value for name, value in item.items()
+                    if name not in ('tags', 'ingredients')
+                }
+            )
+            for item in items
+        ]
+        if connection.features.can_return_rows_from_bulk_insert:
+            Recipe.objects.bulk_create(recipes)
+            log_changes(
+                ChangeLog.RECIPE,
+                ChangeLog.UPSERT,
+                [recipe.id for recipe in recipes]
+            )
+            for recipe in recipes:
+                schedule_recipe_jobs(recipe.id, created=True)
+        else:
+            for recipe in recipes:
+                recipe.save()
+        RecipeToTag.objects.bulk_create(
+            RecipeToTag(recipe=recipe, tag=tag)
+            for recipe, item in zip(recipes, items)
+            for tag in item['tags']
+        )
+        IngredientToRecipe.objects.bulk_create(
+            link
+            for recipe, item in zip(recipes, items)
+            for link in cls.ingredient_links(recipe, item['ingredients'])
+        )
+        return recipes
+
     def to_representation(self, instance):
-        """ Возврат результата."""
+        """ Возврат результата, версия перечитывается после записи."""
 
-        r_serializer = RecipesListSerializer(
-            instance,
+        return RecipesFastListSerializer(
+            Recipe.objects.with_views().get(pk=instance.pk),
             context={'request': self.context.get('request')}
-        )
-        return r_serializer.data
+        ).data
 
     class Meta:
         model = Recipe
@@ -382,3 +610,34 @@ class SubscribeSerializer(UserListSerializer):
             read_only=True
         )
         return serializer.data
+
+
+class JobSerializer(serializers.ModelSerializer):
+    file = SerializerMethodField(read_only=True)
+
+    def get_file(self, job):
+        """ Ссылка на файл готовой выгрузки."""
+
+        if job.status != Job.DONE or not (job.result or {}).get('path'):
+            return None
+        url = reverse('api:jobs-download', args=(job.id,))
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+    class Meta:
+        model = Job
+        fields = (
+            'id',
+            'status',
+            'file',
+            'created',
+            'updated'
+        )
+
+
+class BulkRecipesSerializer(serializers.Serializer):
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_MAX_ITEMS
+    )
@@ -0,0 +1,104 @@
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.exceptions import Throttled
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+from users.hashers import HashingBusy
+
+DURATIONS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """ Token bucket в кеше: одна запись на юзера или IP.
+
+    Частота '120/min' значит ведро на 120 запросов, которое
+    пополняется равномерно за минуту. Проверка - одно чтение и одна
+    запись в кеш независимо от числа запросов в окне.
+    """
+
+    scope = None
+
+    def __init__(self):
+        self.capacity, self.period = self.parse_rate(
+            api_settings.DEFAULT_THROTTLE_RATES[self.scope]
+        )
+        self.cache = caches[settings.THROTTLE_CACHE]
+        self.wait_time = None
+
+    @staticmethod
+    def parse_rate(rate):
+        count, period = rate.split('/')
+        return int(count), DURATIONS[period[0]]
+
+    def applies(self, request, view):
+        return True
+
+    def get_cache_key(self, request):
+        if request.user and request.user.is_authenticated:
+            ident = f'user:{request.user.pk}'
+        else:
+            ident = f'ip:{self.get_ident(request)}'
+        return f'throttle:{self.scope}:{ident}'
+
+    def allow_request(self, request, view):
+        if not self.applies(request, view):
+            return True
+        key = self.get_cache_key(request)
+        refill = self.capacity / self.period
+        now = time.time()
+        tokens, stamp = self.cache.get(key, (self.capacity, now))
+        tokens = min(self.capacity, tokens + (now - stamp) * refill)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        else:
+            self.wait_time = math.ceil((1 - tokens) / refill)
+        self.cache.set(key, (tokens, now), self.period)
+        return allowed
+
+    def wait(self):
+        return self.wait_time
+
+
+class WriteThrottle(TokenBucketThrottle):
+    """ Любые изменяющие запросы."""
+
+    scope = 'writes'
+
+    def applies(self, request, view):
+        return request.method not in SAFE_METHODS
+
+
+class UploadThrottle(TokenBucketThrottle):
+    """ Запись рецептов с картинками в base64."""
+
+    scope = 'uploads'
+
+    def applies(self, request, view):
+        return request.method not in SAFE_METHODS
+
+
+class ExportThrottle(TokenBucketThrottle):
+    """ Выгрузка файлов."""
+
+    scope = 'exports'
+
+
+class AuthThrottle(TokenBucketThrottle):
+    """ Вход, регистрация и смена пароля."""
+
+    scope = 'auth'
+
+
+class HashingLimitMixin:
+    """ Ответ 429, если все места для хеширования паролей заняты."""
+
+    def handle_exception(self, exc):
+        if isinstance(exc, HashingBusy):
+            exc = Throttled(wait=settings.HASHING_WAIT)
+        return super().handle_exception(exc)
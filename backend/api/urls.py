@@ -1,8 +1,9 @@
-from django.urls import include, path
+from django.urls import include, path, re_path
 from rest_framework.routers import DefaultRouter
 
-from api.views import (IngredientsViewSet, RecipesViewSet, TagsViewSet,
-                       UsersViewSet)
+from api.views import (BatchView, IngredientsViewSet, JobsViewSet,
+                       RecipesViewSet, SyncView, TagsViewSet,
+                       ThrottledTokenCreateView, UsersViewSet)
 
 app_name = 'api'
 
@@ -28,8 +29,20 @@ router_v1.register(
     UsersViewSet,
     'users'
 )
+router_v1.register(
+    'jobs',
+    JobsViewSet,
+    'jobs'
+)
 
 urlpatterns = (
+    path('batch/', BatchView.as_view(), name='batch'),
+    path('sync/', SyncView.as_view(), name='sync'),
     path('', include(router_v1.urls)),
+    re_path(
+        r'^auth/token/login/?$',
+        ThrottledTokenCreateView.as_view(),
+        name='login'
+    ),
     path('auth/', include('djoser.urls.authtoken')),
 )
@@ -1,30 +1,92 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.db import transaction
+from django.http import Http404, HttpRequest, QueryDict
 from django.shortcuts import get_object_or_404
+from django.urls import resolve
 from django_filters.rest_framework import DjangoFilterBackend
+from djoser.views import TokenCreateView
 from rest_framework import exceptions, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import (AllowAny, SAFE_METHODS,
                                         IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
-
-from recipes.models import (Ingredient, IngredientToRecipe, Recipe,
-                            RecipesCart, SelectedRecipe, Tag)
+from rest_framework.views import APIView
+
+from backend.delivery import send_content, send_file
+from jobs.models import Job
+from recipes.changes import (changes_since, current_cursor, cursor_expired,
+                             log_changes)
+from recipes.counters import view_counter
+from recipes.models import (ChangeLog, Ingredient, Recipe, RecipeNeighbours,
+                            RecipeNutrition, RecipesCart, SelectedRecipe, Tag)
+from recipes.caches import tag_catalogue
+from recipes.feed import feed_recipe_ids
+from recipes.purge import tombstone_recipes, tombstone_users
+from recipes.shopping import cart_ingredients, cart_totals, render_cart
+from recipes.tasks import build_shopping_cart
 from users.models import Subscribe, User
 
 from .filtres import IngredientsFilter, RecipesFilter
-from .paginations import LimitPagination
+from .paginations import FeedPagination, LimitPagination
 from .permissions import OwnerOrReadOnly
-from .serializers import (IngredientsSerializer, PasswordSerializer,
-                          RecipeSendSerializer, RecipesListSerializer,
+from .serializers import (BulkRecipesSerializer, IngredientsSerializer,
+                          JobSerializer,
+                          PasswordSerializer, RecipeSendSerializer,
+                          RecipesFastListSerializer, RecipesListSerializer,
                           SubcribesRecipesSerializer, SubscribeSerializer,
                           TagsSerializer, UserListSerializer,
                           UserSendSerializer)
+from .throttling import (AuthThrottle, ExportThrottle, HashingLimitMixin,
+                         UploadThrottle)
+
+
+def bulk_relation(model, user, ids, add):
+    """ Пакетное добавление/удаление рецептов в избранное или корзину.
+
+    Статус каждого id: created, exists, deleted, missing, not_found.
+    """
+
+    ids = list(dict.fromkeys(ids))
+    found = set(
+        Recipe.objects.filter(pk__in=ids).values_list('pk', flat=True)
+    )
+    linked = set(model.objects.filter(
+        user=user,
+        recipe_id__in=ids
+    ).values_list('recipe_id', flat=True))
+    with transaction.atomic():
+        if add:
+            created = [pk for pk in ids if pk in found and pk not in linked]
+            model.objects.bulk_create(
+                (model(user=user, recipe_id=pk) for pk in created),
+                ignore_conflicts=True
+            )
+            log_changes(
+                ChangeLog.FAVORITE if model is SelectedRecipe
+                else ChangeLog.CART,
+                ChangeLog.UPSERT,
+                created,
+                user.id
+            )
+        else:
+            model.objects.filter(user=user, recipe_id__in=linked).delete()
+    results = []
+    for pk in ids:
+        if pk not in found:
+            result = 'not_found'
+        elif add:
+            result = 'exists' if pk in linked else 'created'
+        else:
+            result = 'deleted' if pk in linked else 'missing'
+        results.append({'id': pk, 'status': result})
+    return Response({'results': results})
 
 
 class RecipesViewSet(viewsets.ModelViewSet):
-    queryset = Recipe.objects.all()
+    queryset = Recipe.objects.with_views()
     pagination_class = LimitPagination
     permission_classes = (OwnerOrReadOnly, )
     filter_backends = (DjangoFilterBackend,)
@@ -38,11 +100,201 @@ class RecipesViewSet(viewsets.ModelViewSet):
             return RecipesListSerializer
         return RecipeSendSerializer
 
+    def get_throttles(self):
+        throttles = super().get_throttles()
+        if self.action in ('create', 'update', 'partial_update', 'batch'):
+            throttles.append(UploadThrottle())
+        if self.action == 'download_shopping_cart':
+            throttles.append(ExportThrottle())
+        return throttles
+
+    def list(self, request, *args, **kwargs):
+        """ Лента рецептов через облегченный сериализатор."""
+
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        serializer = RecipesFastListSerializer(
+            page if page is not None else queryset,
+            many=True,
+            context=self.get_serializer_context(),
+            fields=request.query_params.get('fields')
+        )
+        if page is not None:
+            return self.get_paginated_response(serializer.data)
+        return Response(serializer.data)
+
+    def retrieve(self, request, *args, **kwargs):
+        """ Карточка рецепта из кеша фрагментов с калорийностью."""
+
+        recipe = self.get_object()
+        view_counter.hit(recipe.id)
+        data = RecipesFastListSerializer(
+            recipe,
+            context=self.get_serializer_context(),
+            fields=request.query_params.get('fields')
+        ).data
+        nutrition = RecipeNutrition.objects.filter(recipe=recipe).first()
+        data['nutrition'] = nutrition and {
+            'calories': nutrition.calories,
+            'price': nutrition.price,
+        }
+        return Response(data)
+
+    def perform_destroy(self, instance):
+        """ Рецепт скрывается сразу, связи удаляет фоновая задача."""
+
+        tombstone_recipes([instance.pk])
+
+    @action(
+        detail=False,
+        methods=('get',),
+        permission_classes=(IsAuthenticated,)
+    )
+    def feed(self, request):
+        """ Лента рецептов авторов из подписок."""
+
+        pagination = FeedPagination()
+        cursor, limit = pagination.get_params(request)
+        ids = feed_recipe_ids(request.user, before=cursor, limit=limit)
+        recipes = Recipe.objects.with_views().in_bulk(ids)
+        serializer = RecipesFastListSerializer(
+            [recipes[pk] for pk in ids if pk in recipes],
+            many=True,
+            context=self.get_serializer_context(),
+            fields=request.query_params.get('fields')
+        )
+        return pagination.get_paginated_response(
+            request,
+            serializer.data,
+            ids[-1] if len(ids) == limit else None
+        )
+
+    @action(
+        detail=True,
+        methods=('get',),
+        pagination_class=None
+    )
+    def similar(self, request, pk=None):
+        """ Похожие рецепты по ингридиентам."""
+
+        recipe = get_object_or_404(Recipe, pk=pk)
+        neighbours = RecipeNeighbours.objects.filter(recipe=recipe).first()
+        ids = [item[0] for item in neighbours.similar] if neighbours else []
+        recipes = Recipe.objects.with_views().in_bulk(ids)
+        serializer = RecipesFastListSerializer(
+            [recipes[item] for item in ids if item in recipes],
+            many=True,
+            context=self.get_serializer_context(),
+            fields=request.query_params.get('fields')
+        )
+        return Response(serializer.data)
+
+    def validate_batch(self, items):
+        """ Проверка пакета рецептов: ошибки по индексам и валидные данные."""
+
+        context = self.get_serializer_context()
+        errors = {}
+        valid = {}
+        names = set()
+        for index, item in enumerate(items):
+            serializer = RecipeSendSerializer(data=item, context=context)
+            if not serializer.is_valid():
+                errors[index] = serializer.errors
+            elif serializer.validated_data['name'] in names:
+                errors[index] = {'name': ['повтор названия в пакете.']}
+            else:
+                names.add(serializer.validated_data['name'])
+                valid[index] = serializer.validated_data
+        known = set(Ingredient.objects.filter(pk__in={
+            item['id']
+            for data in valid.values()
+            for item in data['ingredients']
+        }).values_list('pk', flat=True))
+        for index, data in list(valid.items()):
+            if any(item['id'] not in known for item in data['ingredients']):
+                errors[index] = {'ingredients': ['ингридиент не найден.']}
+                del valid[index]
+        return errors, valid
+
+    @action(
+        detail=False,
+        methods=('post',),
+        permission_classes=(IsAuthenticated,)
+    )
+    def batch(self, request):
+        """ Пакетное создание рецептов в одной транзакции."""
+
+        items = request.data.get('recipes') if isinstance(
+            request.data, dict
+        ) else None
+        if not isinstance(items, list) or not items:
+            raise exceptions.ValidationError(
+                {'recipes': 'ожидается непустой список рецептов.'}
+            )
+        if len(items) > settings.BULK_MAX_ITEMS:
+            raise exceptions.ValidationError(
+                {'recipes': f'не более {settings.BULK_MAX_ITEMS} рецептов.'}
+            )
+        errors, valid = self.validate_batch(items)
+        with transaction.atomic():
+            recipes = RecipeSendSerializer.create_many(
+                list(valid.values()),
+                request.user
+            )
+        created = dict(zip(valid, recipes))
+        results = [
+            {'index': index, 'status': 'created', 'id': created[index].id}
+            if index in created
+            else {'index': index, 'status': 'invalid', 'errors': errors[index]}
+            for index in range(len(items))
+        ]
+        return Response(
+            {'results': results},
+            status=status.HTTP_201_CREATED if recipes else status.HTTP_200_OK
+        )
+
+    @action(
+        detail=False,
+        methods=('post', 'delete'),
+        url_path='favorite/bulk',
+        permission_classes=(IsAuthenticated,)
+    )
+    def favorite_bulk(self, request):
+        """ Пакетная работа с избранным."""
+
+        serializer = BulkRecipesSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return bulk_relation(
+            SelectedRecipe,
+            request.user,
+            serializer.validated_data['recipes'],
+            add=request.method == 'POST'
+        )
+
+    @action(
+        detail=False,
+        methods=('post', 'delete'),
+        url_path='shopping_cart/bulk',
+        permission_classes=(IsAuthenticated,)
+    )
+    def shopping_cart_bulk(self, request):
+        """ Пакетная работа со списком покупок."""
+
+        serializer = BulkRecipesSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return bulk_relation(
+            RecipesCart,
+            request.user,
+            serializer.validated_data['recipes'],
+            add=request.method == 'POST'
+        )
+
     @action(
         detail=True,
         methods=['post', 'delete'],
         permission_classes=(IsAuthenticated,)
     )
+    @transaction.atomic
     def favorite(self, request, pk=None):
         """ Избранные рецепты."""
 
@@ -84,6 +336,7 @@ class RecipesViewSet(viewsets.ModelViewSet):
         methods=('post', 'delete'),
         permission_classes=(IsAuthenticated,)
     )
+    @transaction.atomic
     def shopping_cart(self, request, pk=None):
         """ Добавление/удаление покупок."""
 
@@ -114,6 +367,21 @@ class RecipesViewSet(viewsets.ModelViewSet):
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response(status=status.HTTP_405_METHOD_NOT_ALLOWED)
 
+    @action(
+        detail=False,
+        methods=('get',),
+        url_path='shopping_cart',
+        url_name='shopping-cart-list',
+        permission_classes=(IsAuthenticated,)
+    )
+    def shopping_cart_list(self, request):
+        """ Список покупок в JSON."""
+
+        return Response({
+            'ingredients': list(cart_ingredients(request.user)),
+            'totals': cart_totals(request.user),
+        })
+
     @action(
         detail=False,
         methods=('get',),
@@ -125,26 +393,21 @@ class RecipesViewSet(viewsets.ModelViewSet):
         user = request.user
         if not user.listingredientuser.exists():
             return Response(status=status.HTTP_400_BAD_REQUEST)
-        ingredients = IngredientToRecipe.objects.filter(
-            recipe__listrecipe__user=user
-        ).values(
-            'ingredient__name',
-            'ingredient__measurement_unit'
-        ).annotate(
-            amount=Sum('amount')
-        ).order_by('ingredient__name').distinct()
-        header = 'Что нужно купить:\n\n'
-        cartlist = f'{header}'
-        cartlist += '\n'.join([
-            f'{ingredient["ingredient__name"]}'
-            f' - {ingredient["amount"]}'
-            f' {ingredient["ingredient__measurement_unit"]}.'
-            for ingredient in ingredients
-        ])
-        file = 'cartlist.txt'
-        response = HttpResponse(cartlist, content_type='text/plain')
-        response['Content-Disposition'] = f'attachment; filename={file}'
-        return response
+        if request.query_params.get('async') in ('1', 'true'):
+            recipes = user.listingredientuser.order_by(
+                'recipe_id'
+            ).values_list('recipe_id', flat=True)
+            job = build_shopping_cart.enqueue(
+                {'user_id': user.id},
+                user=user,
+                idempotency_key=f'cart:{user.id}:{hash(tuple(recipes))}'
+            )
+            serializer = JobSerializer(job, context={'request': request})
+            return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+        cartlist = render_cart(cart_ingredients(user), cart_totals(user))
+        return send_content(
+            cartlist.encode(), f'cart/{user.id}', 'cartlist.txt'
+        )
 
 
 class IngredientsViewSet(viewsets.ReadOnlyModelViewSet):
@@ -158,7 +421,7 @@ class IngredientsViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = IngredientsSerializer
 
 
-class UsersViewSet(viewsets.ModelViewSet):
+class UsersViewSet(HashingLimitMixin, viewsets.ModelViewSet):
     """ Для работы с юзерами."""
 
     queryset = User.objects.all()
@@ -173,6 +436,17 @@ class UsersViewSet(viewsets.ModelViewSet):
             return UserListSerializer
         return UserSendSerializer
 
+    def get_throttles(self):
+        throttles = super().get_throttles()
+        if self.action in ('create', 'set_password'):
+            throttles.append(AuthThrottle())
+        return throttles
+
+    def perform_destroy(self, instance):
+        """ Юзер и его рецепты скрываются сразу, удаляются в фоне."""
+
+        tombstone_users([instance.pk])
+
     @action(
         detail=False,
         methods=['get'],
@@ -209,6 +483,7 @@ class UsersViewSet(viewsets.ModelViewSet):
         methods=['post', 'delete'],
         permission_classes=[IsAuthenticated]
     )
+    @transaction.atomic
     def subscribe(self, request, pk=None):
         """ Работа с подписками."""
 
@@ -267,9 +542,163 @@ class UsersViewSet(viewsets.ModelViewSet):
 
 
 class TagsViewSet(viewsets.ReadOnlyModelViewSet):
-    """ Для работы с тегами."""
+    """ Для работы с тегами, ответы собираются из кеша тегов."""
 
     queryset = Tag.objects.all()
     pagination_class = None
     permission_classes = (IsAuthenticatedOrReadOnly,)
     serializer_class = TagsSerializer
+
+    def list(self, request, *args, **kwargs):
+        return Response(tag_catalogue.refresh().tags)
+
+    def retrieve(self, request, *args, **kwargs):
+        tag = tag_catalogue.refresh().by_id.get(
+            int(kwargs['pk']) if kwargs['pk'].isdigit() else None
+        )
+        if tag is None:
+            raise exceptions.NotFound()
+        return Response(tag)
+
+
+class JobsViewSet(viewsets.ReadOnlyModelViewSet):
+    """ Статус фоновых задач юзера."""
+
+    pagination_class = LimitPagination
+    permission_classes = (IsAuthenticated,)
+    serializer_class = JobSerializer
+
+    def get_queryset(self):
+        return Job.objects.filter(user=self.request.user)
+
+    @action(detail=True, methods=('get',))
+    def download(self, request, pk=None):
+        """ Файл готовой выгрузки."""
+
+        job = self.get_object()
+        if job.status != Job.DONE or not (job.result or {}).get('path'):
+            raise Http404('выгрузка не готова.')
+        path = job.result['path']
+        return send_file(
+            path, job.result.get('filename', path.rsplit('/', 1)[-1])
+        )
+
+
+def sub_request(request, url):
+    """ Внутренний GET-запрос к API с авторизацией и кешами внешнего."""
+
+    parsed = urlsplit(url)
+    if not parsed.path.startswith('/api/') or parsed.path == request.path:
+        return status.HTTP_400_BAD_REQUEST, {'errors': 'недопустимый адрес.'}
+    try:
+        match = resolve(parsed.path)
+    except Http404:
+        return status.HTTP_404_NOT_FOUND, None
+    outer = request._request
+    inner = HttpRequest()
+    inner.method = 'GET'
+    inner.path = inner.path_info = parsed.path
+    inner.META = {
+        **outer.META,
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': parsed.path,
+        'QUERY_STRING': parsed.query,
+    }
+    inner.GET = QueryDict(parsed.query)
+    if request.user.is_authenticated:
+        inner._force_auth_user = request.user
+        inner._force_auth_token = request.auth
+    inner._user_marks = getattr(outer, '_user_marks', None)
+    response = match.func(inner, *match.args, **match.kwargs)
+    if inner._user_marks is not None:
+        outer._user_marks = inner._user_marks
+    if hasattr(response, 'data'):
+        return response.status_code, response.data
+    return response.status_code, None
+
+
+class BatchView(APIView):
+    """ Несколько GET-запросов к API за один: ?url=/api/tags/&url=...
+
+    Подзапросы выполняются с юзером внешнего запроса и общими кешами
+    (избранное, корзина, подписки), у каждого свой статус.
+    """
+
+    permission_classes = (AllowAny,)
+
+    def get(self, request):
+        urls = request.query_params.getlist('url')
+        if not urls or len(urls) > settings.BATCH_MAX_REQUESTS:
+            raise exceptions.ValidationError({'url': (
+                f'от 1 до {settings.BATCH_MAX_REQUESTS} адресов.'
+            )})
+        results = []
+        for url in urls:
+            code, body = sub_request(request, url)
+            results.append({'url': url, 'status': code, 'body': body})
+        return Response({'results': results})
+
+
+class SyncView(APIView):
+    """ Изменения после курсора: ?since=<cursor>.
+
+    Без since отдается только текущий курсор, его берут перед полной
+    загрузкой данных. На курсор старше журнала отвечает 410.
+    """
+
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request):
+        since = request.query_params.get('since')
+        if since is None:
+            return Response({'cursor': current_cursor()})
+        if not since.isdigit():
+            raise exceptions.ValidationError(
+                {'since': 'курсор должен быть целым числом.'}
+            )
+        if cursor_expired(int(since)):
+            return Response(
+                {
+                    'errors': 'курсор устарел, загрузите данные заново.',
+                    'cursor': current_cursor(),
+                },
+                status=status.HTTP_410_GONE
+            )
+        cursor, changes, more = changes_since(request.user, int(since))
+        recipes = changes.get(ChangeLog.RECIPE, {})
+        updated = Recipe.objects.with_views().filter(
+            pk__in=recipes.get(ChangeLog.UPSERT, ())
+        )
+        data = RecipesFastListSerializer(
+            updated,
+            many=True,
+            context={'request': request}
+        ).data
+        found = {recipe['id'] for recipe in data}
+        response = {
+            'cursor': cursor,
+            'has_more': more,
+            'recipes': {
+                'updated': data,
+                'deleted': sorted(
+                    set(recipes.get(ChangeLog.DELETE, ()))
+                    | set(recipes.get(ChangeLog.UPSERT, ())) - found
+                ),
+            },
+        }
+        for kind, name in (
+            (ChangeLog.FAVORITE, 'favorites'),
+            (ChangeLog.CART, 'cart'),
+            (ChangeLog.SUBSCRIPTION, 'subscriptions'),
+        ):
+            response[name] = {
+                'added': changes.get(kind, {}).get(ChangeLog.UPSERT, []),
+                'removed': changes.get(kind, {}).get(ChangeLog.DELETE, []),
+            }
+        return Response(response)
+
+
+class ThrottledTokenCreateView(HashingLimitMixin, TokenCreateView):
+    """ Получение токена с ограничением частоты попыток."""
+
+    throttle_classes = (AuthThrottle,)
@@ -0,0 +1,30 @@
+from django.contrib import admin
+
+from .paginators import EstimatedCountPaginator
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """ Список без полного COUNT(*) и с оценкой числа строк."""
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    empty_value_display = '-пусто-'
+
+
+class TombstoneAdmin(LargeTableAdmin):
+    """ Удаление из админки только скрывает объекты, зависимые записи
+    удаляет фоновая задача.
+
+    Страница подтверждения не обходит связи: их могут быть миллионы.
+    """
+
+    tombstone = None
+
+    def get_deleted_objects(self, objs, request):
+        return [str(obj) for obj in objs], {}, set(), []
+
+    def delete_model(self, request, obj):
+        self.tombstone([obj.pk])
+
+    def delete_queryset(self, request, queryset):
+        self.tombstone(queryset.values_list('pk', flat=True))
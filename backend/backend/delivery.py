@@ -0,0 +1,99 @@
+import os
+import tempfile
+import time
+from pathlib import Path, PurePath
+from uuid import uuid4
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse
+
+
+def spool_path(name):
+    """ Путь файла в каталоге выгрузок, без выхода за его пределы."""
+
+    root = Path(settings.EXPORTS_ROOT).resolve()
+    path = (root / name).resolve()
+    if root not in path.parents:
+        raise ValueError(f'путь вне каталога выгрузок: {name}')
+    return path
+
+
+def spool_name(directory, suffix):
+    """ Новое имя выгрузки в каталоге, у каждой выгрузки свой файл."""
+
+    spool_path(directory)
+    return f'{directory}/{uuid4().hex}{suffix}'
+
+
+def spool_prune():
+    """ Удаление выгрузок старше EXPORTS_TTL секунд и пустых каталогов."""
+
+    root = Path(settings.EXPORTS_ROOT)
+    expired = time.time() - settings.EXPORTS_TTL
+    deleted = 0
+    for directory, _, files in os.walk(root, topdown=False):
+        for name in files:
+            path = Path(directory, name)
+            try:
+                if path.stat().st_mtime < expired:
+                    path.unlink()
+                    deleted += 1
+            except FileNotFoundError:
+                continue
+        if Path(directory) != root:
+            try:
+                Path(directory).rmdir()
+            except OSError:
+                pass
+    return deleted
+
+
+def spool_write(name, content):
+    """ Атомарная запись выгрузки: временный файл и os.replace."""
+
+    path = spool_path(name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    descriptor, temporary = tempfile.mkstemp(dir=path.parent)
+    with os.fdopen(descriptor, 'wb') as file:
+        file.write(content)
+    os.replace(temporary, path)
+    return name
+
+
+def send_file(name, filename, content_type='text/plain; charset=utf-8'):
+    """ Отдача выгрузки после проверки прав во view.
+
+    В режиме FILE_DELIVERY=accel байты отдает nginx по X-Accel-Redirect,
+    воркер gunicorn освобождается сразу.
+    """
+
+    path = spool_path(name)
+    if not path.is_file():
+        raise Http404('файл не найден.')
+    if settings.FILE_DELIVERY == 'accel':
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = f'{settings.PROTECTED_URL}{name}'
+        response['Content-Disposition'] = f'attachment; filename={filename}'
+        return response
+    return FileResponse(
+        open(path, 'rb'),
+        as_attachment=True,
+        filename=filename,
+        content_type=content_type
+    )
+
+
+def send_content(content, directory, filename,
+                 content_type='text/plain; charset=utf-8'):
+    """ Отдача файла, собранного в запросе.
+
+    В режиме accel файл пишется в каталог выгрузок и отдается nginx,
+    иначе байты уходят сразу, без записи на диск.
+    """
+
+    if settings.FILE_DELIVERY == 'accel':
+        name = spool_name(directory, PurePath(filename).suffix)
+        return send_file(spool_write(name, content), filename, content_type)
+    response = HttpResponse(content, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename={filename}'
+    return response
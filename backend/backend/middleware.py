@@ -0,0 +1,244 @@
+import gzip
+import hashlib
+import logging
+import math
+import re
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth import middleware as auth_middleware
+from django.contrib.messages import middleware as message_middleware
+from django.contrib.sessions import middleware as session_middleware
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.middleware import clickjacking, csrf
+from django.utils.cache import patch_vary_headers
+
+from backend import routers
+from users.hashers import HashingBusy
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+API_PREFIX = '/api/'
+COMPRESSIBLE_TYPES = ('application/json', 'text/')
+PIN_COOKIE = 'replica_pin'
+
+logger = logging.getLogger(__name__)
+
+
+class ReplicaMiddleware:
+    """ Выбор реплики для безопасных запросов и read-your-writes.
+
+    После записи клиент получает подписанную cookie на
+    REPLICA_STICKY_SECONDS и с ней читает только с основной базы, пока
+    реплики догоняют. Метка едет с клиентом, поэтому работает при любом
+    числе воркеров и без общего кеша.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    @staticmethod
+    def pinned(request):
+        return request.get_signed_cookie(
+            PIN_COOKIE,
+            default=None,
+            salt=PIN_COOKIE,
+            max_age=settings.REPLICA_STICKY_SECONDS
+        ) is not None
+
+    def __call__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+        routers.state.wrote = False
+        if request.method in SAFE_METHODS and not self.pinned(request):
+            routers.use_replica()
+        else:
+            routers.use_primary()
+        try:
+            response = self.get_response(request)
+            if request.method not in SAFE_METHODS or routers.wrote():
+                response.set_signed_cookie(
+                    PIN_COOKIE,
+                    '1',
+                    salt=PIN_COOKIE,
+                    max_age=settings.REPLICA_STICKY_SECONDS,
+                    secure=request.is_secure(),
+                    httponly=True,
+                    samesite='Lax'
+                )
+        finally:
+            routers.use_primary()
+        return response
+
+
+class HashingBusyMiddleware:
+    """ 503 вместо 500, если вход вне API (админка) не дождался места
+    для хеширования пароля.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_exception(self, request, exception):
+        if not isinstance(exception, HashingBusy):
+            return None
+        response = HttpResponse(
+            'слишком много входов, повторите позже.',
+            status=503,
+            content_type='text/plain; charset=utf-8'
+        )
+        response['Retry-After'] = str(math.ceil(settings.HASHING_WAIT))
+        return response
+
+
+class SkipAPIMixin:
+    """ Middleware админки, которое не нужно API с токенами.
+
+    Запросы к /api/ проходят мимо без сессий, CSRF, сообщений и
+    заголовков X-Frame-Options, остальные пути - как в Django.
+    """
+
+    def __call__(self, request):
+        if request.path_info.startswith(API_PREFIX):
+            return self.get_response(request)
+        return super().__call__(request)
+
+
+class SessionMiddleware(SkipAPIMixin, session_middleware.SessionMiddleware):
+    pass
+
+
+class CsrfViewMiddleware(SkipAPIMixin, csrf.CsrfViewMiddleware):
+
+    def process_view(self, request, callback, callback_args, callback_kwargs):
+        if request.path_info.startswith(API_PREFIX):
+            return None
+        return super().process_view(
+            request, callback, callback_args, callback_kwargs
+        )
+
+
+class AuthenticationMiddleware(
+    SkipAPIMixin, auth_middleware.AuthenticationMiddleware
+):
+    pass
+
+
+class MessageMiddleware(SkipAPIMixin, message_middleware.MessageMiddleware):
+    pass
+
+
+class XFrameOptionsMiddleware(
+    SkipAPIMixin, clickjacking.XFrameOptionsMiddleware
+):
+    pass
+
+
+class CompressionMiddleware:
+    """ Сжатие ответов API: brotli, если установлен и принимается, иначе gzip.
+
+    Сжатые байты анонимных ответов кешируются по хешу тела, поэтому
+    горячие страницы сжимаются один раз. Время сжатия и размеры
+    отдаются в Server-Timing и копятся в stats процесса.
+    """
+
+    stats = Counter()
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    @staticmethod
+    def choose_encoding(request):
+        accepted = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        if brotli is not None and re.search(r'\bbr\b', accepted):
+            return 'br'
+        if re.search(r'\bgzip\b', accepted):
+            return 'gzip'
+        return None
+
+    @staticmethod
+    def compress(body, encoding):
+        if encoding == 'br':
+            return brotli.compress(body, quality=settings.BROTLI_QUALITY)
+        return gzip.compress(body, settings.GZIP_LEVEL, mtime=0)
+
+    def compressed(self, request, body, encoding):
+        """ Сжатые байты и признак попадания в кеш."""
+
+        cacheable = (
+            'HTTP_AUTHORIZATION' not in request.META
+            and len(body) <= settings.COMPRESS_CACHE_MAX_SIZE
+        )
+        if cacheable:
+            key = (
+                f'compressed:{encoding}:{hashlib.sha1(body).hexdigest()}'
+            )
+            content = caches[settings.COMPRESS_CACHE].get(key)
+            if content is not None:
+                return content, True
+        content = self.compress(body, encoding)
+        if cacheable:
+            caches[settings.COMPRESS_CACHE].set(
+                key, content, settings.COMPRESS_CACHE_TIMEOUT
+            )
+        return content, False
+
+    def report(self, encoding, size, compressed_size, seconds, hit):
+        stats = self.stats
+        stats['responses'] += 1
+        stats['hits' if hit else 'misses'] += 1
+        stats['bytes_in'] += size
+        stats['bytes_out'] += compressed_size
+        stats['cpu_ms'] += seconds * 1000
+        if stats['responses'] % settings.COMPRESS_LOG_EVERY == 0:
+            logger.info(
+                'compression: %d responses, ratio %.2f, cpu %.1f ms,'
+                ' cache hits %d',
+                stats['responses'],
+                stats['bytes_out'] / max(1, stats['bytes_in']),
+                stats['cpu_ms'],
+                stats['hits']
+            )
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (
+            not request.path_info.startswith(API_PREFIX)
+            or response.streaming
+            or response.has_header('Content-Encoding')
+            or not response.get('Content-Type', '').startswith(
+                COMPRESSIBLE_TYPES
+            )
+        ):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = self.choose_encoding(request)
+        body = response.content
+        if encoding is None or len(body) < settings.COMPRESS_MIN_SIZE:
+            return response
+        started = time.process_time()
+        content, hit = self.compressed(request, body, encoding)
+        seconds = time.process_time() - started
+        if len(content) >= len(body):
+            return response
+        response.content = content
+        response['Content-Length'] = str(len(content))
+        response['Content-Encoding'] = encoding
+        if response.has_header('ETag'):
+            response['ETag'] = re.sub(r'^"', 'W/"', response['ETag'])
+        response['Server-Timing'] = (
+            f'compress;dur={seconds * 1000:.2f};'
+            f'desc="{encoding} {len(body)}>{len(content)}'
+            f'{" cached" if hit else ""}"'
+        )
+        self.report(encoding, len(body), len(content), seconds, hit)
+        return response
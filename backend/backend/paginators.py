@@ -0,0 +1,49 @@
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+EXACT_COUNT_LIMIT = 10000
+
+
+class EstimatedCountPaginator(Paginator):
+    """ Пагинатор с оценкой числа строк для больших таблиц.
+
+    Для запросов без фильтров в Postgres берется reltuples из
+    pg_class (у секционированных таблиц - сумма по секциям), точный
+    COUNT(*) только для небольших таблиц и выборок с условиями
+    (поиск, фильтры). Условие менеджера по умолчанию (скрытые
+    deleted_at) фильтром не считается: скрытые строки вычитаются
+    из оценки по индексу.
+    """
+
+    def estimated(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT SUM(GREATEST(reltuples, 0)) FROM pg_class '
+                'WHERE oid = %s::regclass OR oid IN (SELECT inhrelid '
+                'FROM pg_inherits WHERE inhparent = %s::regclass)',
+                [self.object_list.model._meta.db_table] * 2
+            )
+            return cursor.fetchone()[0]
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is None or query.distinct:
+            return super().count
+        model = self.object_list.model
+        if query.where and query.where != (
+            model._default_manager.all().query.where
+        ):
+            return super().count
+        connection = connections[self.object_list.db]
+        if connection.vendor != 'postgresql':
+            return super().count
+        rows = self.estimated(connection)
+        if rows is None or rows < EXACT_COUNT_LIMIT:
+            return super().count
+        if query.where:
+            rows -= model._base_manager.filter(
+                deleted_at__isnull=False
+            ).count()
+        return max(0, int(rows))
@@ -0,0 +1,215 @@
+import re
+
+from django.db import connection, transaction
+
+PARTITION_KEY = 'user_id'
+
+INDEX_HEAD = re.compile(r'^CREATE (UNIQUE )?INDEX \S+ ON (ONLY )?\S+ ')
+
+MIRROR = '''
+CREATE FUNCTION {function}() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        DELETE FROM {shadow}
+        WHERE id = OLD.id AND {key} = OLD.{key};
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO {shadow} SELECT NEW.* ON CONFLICT DO NOTHING;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+CREATE TRIGGER {function} AFTER INSERT OR UPDATE OR DELETE ON {table}
+FOR EACH ROW EXECUTE FUNCTION {function}();
+'''
+
+
+def partitioned_models():
+    """ Таблицы связей юзер - объект, растущие как юзеры x объекты."""
+
+    from recipes.models import RecipesCart, SelectedRecipe
+    from users.models import Subscribe
+
+    return [SelectedRecipe, RecipesCart, Subscribe]
+
+
+def temporary_name(name):
+    return f'{name[:59]}_new'
+
+
+def quote(name):
+    return connection.ops.quote_name(name)
+
+
+def relation_kind(cursor, table):
+    cursor.execute(
+        'SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)', [table]
+    )
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def table_constraints(cursor, table):
+    cursor.execute(
+        "SELECT conname, contype, pg_get_constraintdef(oid) "
+        "FROM pg_constraint WHERE conrelid = %s::regclass "
+        "AND contype IN ('p', 'u', 'f', 'c') ORDER BY contype",
+        [table]
+    )
+    return cursor.fetchall()
+
+
+def table_indexes(cursor, table):
+    """ Индексы таблицы, кроме созданных под ограничения."""
+
+    cursor.execute(
+        'SELECT class.relname, pg_get_indexdef(index.indexrelid) '
+        'FROM pg_index index '
+        'JOIN pg_class class ON class.oid = index.indexrelid '
+        'WHERE index.indrelid = %s::regclass AND NOT EXISTS ('
+        'SELECT FROM pg_constraint WHERE conindid = index.indexrelid)',
+        [table]
+    )
+    return cursor.fetchall()
+
+
+def constraint_definition(table, kind, definition):
+    """ Ограничение для секционированной таблицы.
+
+    Первичный и уникальные ключи должны включать ключ секционирования,
+    поэтому id дополняется user_id, а уникальность без user_id
+    перенести нельзя.
+    """
+
+    if kind == 'p':
+        return f'PRIMARY KEY (id, {PARTITION_KEY})'
+    if kind == 'u' and PARTITION_KEY not in definition:
+        raise ValueError(
+            f'{table}: уникальность без {PARTITION_KEY}: {definition}'
+        )
+    return definition
+
+
+def create_shadow(table, partitions):
+    """ Секционированная копия таблицы с ограничениями, индексами и
+    триггером, который повторяет в ней записи в исходную таблицу.
+    """
+
+    shadow = temporary_name(table)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TABLE {quote(shadow)} '
+            f'(LIKE {quote(table)} INCLUDING DEFAULTS) '
+            f'PARTITION BY HASH ({PARTITION_KEY})'
+        )
+        for remainder in range(partitions):
+            cursor.execute(
+                f'CREATE TABLE {quote(f"{table}_p{remainder}")} '
+                f'PARTITION OF {quote(shadow)} FOR VALUES WITH '
+                f'(MODULUS {partitions}, REMAINDER {remainder})'
+            )
+        for name, kind, definition in table_constraints(cursor, table):
+            cursor.execute(
+                f'ALTER TABLE {quote(shadow)} '
+                f'ADD CONSTRAINT {quote(temporary_name(name))} '
+                f'{constraint_definition(table, kind, definition)}'
+            )
+        for name, definition in table_indexes(cursor, table):
+            cursor.execute(INDEX_HEAD.sub(
+                lambda match: (
+                    f'CREATE {match.group(1) or ""}INDEX '
+                    f'{quote(temporary_name(name))} ON {quote(shadow)} '
+                ),
+                definition,
+                count=1
+            ))
+        cursor.execute(MIRROR.format(
+            function=quote(f'{table[:56]}_mirror'),
+            shadow=quote(shadow),
+            table=quote(table),
+            key=PARTITION_KEY,
+        ))
+
+
+def copy_rows(table, batch_size, progress=None):
+    """ Перенос строк пачками по id.
+
+    Строки пачки блокируются FOR SHARE: параллельное удаление ждет
+    конца пачки, и триггер удаляет уже скопированную строку. Новые
+    строки после максимального id переносит триггер.
+    """
+
+    shadow = temporary_name(table)
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT COALESCE(MAX(id), 0) FROM {quote(table)}')
+        last = cursor.fetchone()[0]
+    start = 0
+    while start < last:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {quote(shadow)} SELECT * FROM ('
+                f'SELECT * FROM {quote(table)} WHERE id > %s AND id <= %s '
+                f'FOR SHARE) AS batch ON CONFLICT DO NOTHING',
+                [start, start + batch_size]
+            )
+        start += batch_size
+        if progress:
+            progress(min(start, last), last)
+    with connection.cursor() as cursor:
+        cursor.execute(f'ANALYZE {quote(shadow)}')
+
+
+def swap(table):
+    """ Подмена таблицы секционированной копией в одной транзакции.
+
+    Последовательность id переходит к новой таблице, старая
+    удаляется, ограничениям и индексам возвращаются прежние имена.
+    """
+
+    shadow = temporary_name(table)
+    function = quote(f'{table[:56]}_mirror')
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE {quote(table)} IN ACCESS EXCLUSIVE MODE')
+        constraints = table_constraints(cursor, table)
+        indexes = table_indexes(cursor, table)
+        cursor.execute(f'DROP TRIGGER {function} ON {quote(table)}')
+        cursor.execute(f'DROP FUNCTION {function}()')
+        cursor.execute('SELECT pg_get_serial_sequence(%s, %s)', [table, 'id'])
+        sequence = cursor.fetchone()[0]
+        if sequence:
+            cursor.execute(
+                f'ALTER SEQUENCE {sequence} OWNED BY {quote(shadow)}.id'
+            )
+        cursor.execute(f'DROP TABLE {quote(table)}')
+        cursor.execute(
+            f'ALTER TABLE {quote(shadow)} RENAME TO {quote(table)}'
+        )
+        for name, kind, definition in constraints:
+            cursor.execute(
+                f'ALTER TABLE {quote(table)} RENAME CONSTRAINT '
+                f'{quote(temporary_name(name))} TO {quote(name)}'
+            )
+        for name, definition in indexes:
+            cursor.execute(
+                f'ALTER INDEX {quote(temporary_name(name))} '
+                f'RENAME TO {quote(name)}'
+            )
+
+
+def partition_table(table, partitions, batch_size, progress=None):
+    """ Онлайн-перевод таблицы на хеш-секции по user_id.
+
+    Прерванный перенос продолжается с существующей копией, повторно
+    скопированные строки пропускаются через ON CONFLICT.
+    """
+
+    with connection.cursor() as cursor:
+        kind = relation_kind(cursor, table)
+        shadow_kind = relation_kind(cursor, temporary_name(table))
+    if kind == 'p':
+        return False
+    if shadow_kind is None:
+        create_shadow(table, partitions)
+    copy_rows(table, batch_size, progress)
+    swap(table)
+    return True
@@ -0,0 +1,88 @@
+import random
+
+from asgiref.local import Local
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+HEALTH_KEY = 'replicas:healthy'
+
+LAG_QUERIES = {
+    'postgresql': (
+        'SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn()'
+        ' THEN 0 ELSE COALESCE(EXTRACT(EPOCH FROM now()'
+        ' - pg_last_xact_replay_timestamp()), 0) END'
+    ),
+}
+
+state = Local()
+
+
+def replica_lag(alias):
+    """ Отставание реплики в секундах, None если она недоступна."""
+
+    connection = connections[alias]
+    query = LAG_QUERIES.get(connection.vendor, 'SELECT 0')
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(query)
+            return float(cursor.fetchone()[0] or 0)
+    except DatabaseError:
+        connection.close()
+        return None
+
+
+def healthy_replicas():
+    """ Реплики с допустимым отставанием, проверка кешируется."""
+
+    def check():
+        healthy = []
+        for alias in settings.DATABASE_REPLICAS:
+            lag = replica_lag(alias)
+            if lag is not None and lag <= settings.REPLICA_MAX_LAG:
+                healthy.append(alias)
+        return healthy
+
+    return cache.get_or_set(
+        HEALTH_KEY, check, settings.REPLICA_CHECK_INTERVAL
+    )
+
+
+def use_replica():
+    """ Чтения текущего запроса идут на случайную здоровую реплику."""
+
+    replicas = healthy_replicas()
+    state.alias = random.choice(replicas) if replicas else None
+
+
+def use_primary():
+    state.alias = None
+
+
+def wrote():
+    return getattr(state, 'wrote', False)
+
+
+class ReplicaRouter:
+    """ Чтения безопасных запросов на реплику, запись на основную базу.
+
+    Реплика выбирается в ReplicaMiddleware, без нее (команды, воркер,
+    запись внутри запроса, транзакция) все идет на основную базу.
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = getattr(state, 'alias', None)
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        state.alias = None
+        state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
@@ -10,8 +10,10 @@ DEBUG = False
 
 ALLOWED_HOSTS = ['localhost', '127.0.0.1', 'pkittys.sytes.net']
 
+ADMIN_ENABLED = os.getenv('ADMIN_ENABLED', 'True') == 'True'
+
 INSTALLED_APPS = [
-    'django.contrib.admin',
+    *(['django.contrib.admin'] if ADMIN_ENABLED else []),
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
@@ -24,16 +26,20 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'recipes.apps.RecipesConfig',
     'api.apps.ApiConfig',
+    'jobs.apps.JobsConfig',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'backend.middleware.CompressionMiddleware',
+    'backend.middleware.ReplicaMiddleware',
+    'backend.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
-    'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'django.contrib.messages.middleware.MessageMiddleware',
-    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'backend.middleware.CsrfViewMiddleware',
+    'backend.middleware.AuthenticationMiddleware',
+    'backend.middleware.MessageMiddleware',
+    'backend.middleware.XFrameOptionsMiddleware',
+    'backend.middleware.HashingBusyMiddleware',
 ]
 
 ROOT_URLCONF = 'backend.urls'
@@ -67,6 +73,28 @@ DATABASES = {
     }
 }
 
+DATABASE_REPLICAS = []
+
+for number, host in enumerate(filter(None, os.getenv(
+    'REPLICA_HOSTS', ''
+).split(','))):
+    DATABASE_REPLICAS.append(f'replica{number}')
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'],
+        'HOST': host.strip(),
+        'OPTIONS': {'connect_timeout': 2},
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['backend.routers.ReplicaRouter']
+
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', 5))
+REPLICA_MAX_LAG = float(os.getenv('REPLICA_MAX_LAG', 2))
+REPLICA_CHECK_INTERVAL = int(os.getenv('REPLICA_CHECK_INTERVAL', 5))
+
+PARTITIONS = int(os.getenv('PARTITIONS', 16))
+PARTITION_BATCH_SIZE = 10000
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -82,6 +110,18 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+PASSWORD_HASHERS = list(dict.fromkeys([
+    os.getenv('PASSWORD_HASHER', 'users.hashers.Argon2PasswordHasher'),
+    'users.hashers.Argon2PasswordHasher',
+    'users.hashers.PBKDF2PasswordHasher',
+]))
+
+ARGON2_TIME_COST = int(os.getenv('ARGON2_TIME_COST', 2))
+ARGON2_MEMORY_COST = int(os.getenv('ARGON2_MEMORY_COST', 19456))
+ARGON2_PARALLELISM = 1
+HASHING_CONCURRENCY = int(os.getenv('HASHING_CONCURRENCY', 2))
+HASHING_WAIT = float(os.getenv('HASHING_WAIT', 2))
+
 LANGUAGE_CODE = 'ru'
 
 TIME_ZONE = 'Europe/Moscow'
@@ -98,6 +138,17 @@ STATIC_ROOT = BASE_DIR / 'collect_static'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = '/media'
 
+SNAPSHOTS_ROOT = os.getenv('SNAPSHOTS_ROOT', '/static_backend/snapshots')
+SNAPSHOTS_URL = '/snapshots/'
+SNAPSHOTS_KEEP = 3
+SNAPSHOTS_DEBOUNCE = int(os.getenv('SNAPSHOTS_DEBOUNCE', 5))
+
+FILE_DELIVERY = os.getenv('FILE_DELIVERY', 'django')
+EXPORTS_ROOT = os.getenv('EXPORTS_ROOT', BASE_DIR / 'exports')
+EXPORTS_TTL = int(os.getenv('EXPORTS_TTL', 86400))
+EXPORTS_PRUNE_INTERVAL = 3600
+PROTECTED_URL = '/protected/'
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
@@ -109,6 +160,106 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 6,
+    'NUM_PROXIES': 1,
+    'DEFAULT_THROTTLE_CLASSES': [
+        'api.throttling.WriteThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'writes': os.getenv('THROTTLE_WRITES', '120/min'),
+        'uploads': os.getenv('THROTTLE_UPLOADS', '20/min'),
+        'exports': os.getenv('THROTTLE_EXPORTS', '10/min'),
+        'auth': os.getenv('THROTTLE_AUTH', '10/min'),
+    },
+}
+
+CACHE_BACKEND = os.getenv(
+    'CACHE_BACKEND',
+    'django.core.cache.backends.locmem.LocMemCache'
+)
+CACHE_LOCATION = os.getenv('CACHE_LOCATION', '')
+LOCAL_CACHE = CACHE_BACKEND.endswith('LocMemCache')
+
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': CACHE_LOCATION,
+    },
+    'throttle': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': 'throttle' if LOCAL_CACHE else CACHE_LOCATION,
+        'KEY_PREFIX': 'throttle',
+        'OPTIONS': {'MAX_ENTRIES': 100000} if LOCAL_CACHE else {},
+    },
+    'fragments': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': 'fragments' if LOCAL_CACHE else CACHE_LOCATION,
+        'KEY_PREFIX': 'fragments',
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('RECIPE_FRAGMENT_ENTRIES', 5000))
+        } if LOCAL_CACHE else {},
+    },
+    'compressed': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': 'compressed' if LOCAL_CACHE else CACHE_LOCATION,
+        'KEY_PREFIX': 'compressed',
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('COMPRESS_CACHE_ENTRIES', 200))
+        } if LOCAL_CACHE else {},
+    },
 }
 
+THROTTLE_CACHE = 'throttle'
+FRAGMENT_CACHE = 'fragments'
+COMPRESS_CACHE = 'compressed'
+
 AUTH_USER_MODEL = 'users.User'
+
+JOBS_BACKEND = os.getenv('JOBS_BACKEND', 'jobs.backends.DatabaseBackend')
+JOBS_QUEUES = {
+    'default': int(os.getenv('JOBS_DEFAULT_CONCURRENCY', 4)),
+    'exports': int(os.getenv('JOBS_EXPORTS_CONCURRENCY', 2)),
+}
+JOBS_LOCK_TIMEOUT = int(os.getenv('JOBS_LOCK_TIMEOUT', 600))
+JOBS_RETRY_DELAY = int(os.getenv('JOBS_RETRY_DELAY', 10))
+
+FEED_FANOUT_LIMIT = int(os.getenv('FEED_FANOUT_LIMIT', 10000))
+FEED_CELEBRITIES_TIMEOUT = int(os.getenv('FEED_CELEBRITIES_TIMEOUT', 600))
+FEED_BATCH_SIZE = 1000
+FEED_BACKFILL = 50
+
+TRENDING_HALF_LIFE_HOURS = float(os.getenv('TRENDING_HALF_LIFE_HOURS', 48))
+TRENDING_FAVORITE_WEIGHT = 1.0
+TRENDING_CART_WEIGHT = 0.5
+TRENDING_INTERVAL = int(os.getenv('TRENDING_INTERVAL', 300))
+TRENDING_REBUILD_EVERY = int(os.getenv('TRENDING_REBUILD_EVERY', 288))
+TRENDING_SETTLE = 5
+TRENDING_BATCH_SIZE = 2000
+
+SIMILAR_RECIPES = int(os.getenv('SIMILAR_RECIPES', 12))
+SIMILAR_CANDIDATES_FACTOR = 5
+SIMILAR_BLOCK_CELLS = 8_000_000
+
+NUTRITION_BATCH_SIZE = 5000
+
+BULK_MAX_ITEMS = int(os.getenv('BULK_MAX_ITEMS', 500))
+BATCH_MAX_REQUESTS = 10
+
+PURGE_BATCH_SIZE = int(os.getenv('PURGE_BATCH_SIZE', 1000))
+
+SYNC_LIMIT = 1000
+SYNC_NUMBER_BATCH = 10000
+SYNC_RETENTION_DAYS = int(os.getenv('SYNC_RETENTION_DAYS', 30))
+SYNC_PRUNE_INTERVAL = 86400
+
+VIEWS_FLUSH_INTERVAL = int(os.getenv('VIEWS_FLUSH_INTERVAL', 10))
+VIEWS_FLUSH_SIZE = 1000
+
+TAGS_CACHE_TIMEOUT = int(os.getenv('TAGS_CACHE_TIMEOUT', 60))
+RECIPE_FRAGMENT_TIMEOUT = int(os.getenv('RECIPE_FRAGMENT_TIMEOUT', 86400))
+
+COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 1024))
+COMPRESS_CACHE_TIMEOUT = int(os.getenv('COMPRESS_CACHE_TIMEOUT', 300))
+COMPRESS_CACHE_MAX_SIZE = int(os.getenv('COMPRESS_CACHE_MAX_SIZE', 64 * 1024))
+COMPRESS_LOG_EVERY = 1000
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
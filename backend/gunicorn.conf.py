@@ -0,0 +1,37 @@
+import gc
+import multiprocessing
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8888')
+workers = int(
+    os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1)
+)
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = max_requests // 10
+preload_app = True
+worker_tmp_dir = '/dev/shm'
+
+
+def when_ready(server):
+    """ Догрузка URLconf в мастере и заморозка кучи перед fork.
+
+    Объекты из gc.freeze не трогаются сборщиком в воркерах,
+    поэтому их страницы остаются общими.
+    """
+
+    from django.urls import get_resolver
+
+    get_resolver().url_patterns
+    gc.collect()
+    gc.freeze()
+
+
+def worker_exit(server, worker):
+    """ Запись накопленных просмотров перед остановкой воркера."""
+
+    from recipes.counters import view_counter
+
+    view_counter.flush()
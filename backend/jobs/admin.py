@@ -0,0 +1,22 @@
+from django.contrib import admin
+
+from backend.admin import LargeTableAdmin
+
+from .models import Job
+
+
+class JobAdmin(LargeTableAdmin):
+    list_display = (
+        'pk',
+        'name',
+        'queue',
+        'status',
+        'attempts',
+        'run_at',
+        'updated',
+    )
+    list_filter = ('status', 'queue')
+    raw_id_fields = ('user',)
+
+
+admin.site.register(Job, JobAdmin)
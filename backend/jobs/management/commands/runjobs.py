@@ -0,0 +1,48 @@
+import os
+import socket
+import time
+
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from jobs.queue import get_backend
+
+
+class Command(BaseCommand):
+    """ Воркер фоновых задач."""
+
+    help = 'выполнение задач из очереди Job'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--queue',
+            action='append',
+            dest='queues',
+            help='очередь, можно указать несколько раз (по умолчанию все)'
+        )
+        parser.add_argument('--sleep', type=float, default=1.0)
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='выйти, когда очередь опустеет'
+        )
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        queues = options['queues'] or list(settings.JOBS_QUEUES)
+        worker = f'{socket.gethostname()}:{os.getpid()}'
+        self.stdout.write(f'воркер {worker} слушает: {", ".join(queues)}')
+        while True:
+            done = 0
+            for queue in queues:
+                backend.release_stale(queue)
+                job = backend.claim(queue, worker)
+                if job is None:
+                    continue
+                job = backend.run(job)
+                done += 1
+                self.stdout.write(f'{job}')
+            if not done:
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
@@ -0,0 +1,118 @@
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+
+
+class Job(models.Model):
+    """ Фоновая задача."""
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    ACTIVE = (QUEUED, RUNNING)
+    STATUSES = (
+        (QUEUED, 'в очереди'),
+        (RUNNING, 'выполняется'),
+        (DONE, 'выполнена'),
+        (FAILED, 'ошибка'),
+    )
+
+    queue = models.CharField(
+        verbose_name='очередь',
+        max_length=50,
+        default='default'
+    )
+    name = models.CharField(
+        verbose_name='задача',
+        max_length=150
+    )
+    payload = models.JSONField(
+        verbose_name='аргументы',
+        default=dict,
+        blank=True
+    )
+    status = models.CharField(
+        verbose_name='статус',
+        max_length=10,
+        choices=STATUSES,
+        default=QUEUED
+    )
+    attempts = models.PositiveSmallIntegerField(
+        verbose_name='попыток',
+        default=0
+    )
+    max_attempts = models.PositiveSmallIntegerField(
+        verbose_name='максимум попыток',
+        default=3
+    )
+    idempotency_key = models.CharField(
+        verbose_name='ключ идемпотентности',
+        max_length=100,
+        null=True,
+        blank=True
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='jobs',
+        verbose_name='юзер',
+        null=True,
+        blank=True
+    )
+    result = models.JSONField(
+        verbose_name='результат',
+        null=True,
+        blank=True
+    )
+    error = models.TextField(
+        verbose_name='ошибка',
+        blank=True
+    )
+    run_at = models.DateTimeField(
+        verbose_name='запустить после',
+        default=timezone.now
+    )
+    locked_by = models.CharField(
+        verbose_name='воркер',
+        max_length=100,
+        blank=True
+    )
+    locked_at = models.DateTimeField(
+        verbose_name='взята в работу',
+        null=True,
+        blank=True
+    )
+    created = models.DateTimeField(
+        verbose_name='создана',
+        auto_now_add=True
+    )
+    updated = models.DateTimeField(
+        verbose_name='обновлена',
+        auto_now=True
+    )
+
+    class Meta:
+        ordering = ('-id',)
+        verbose_name = 'фоновая задача'
+        verbose_name_plural = 'фоновые задачи'
+        indexes = [
+            models.Index(
+                fields=['queue', 'status', 'run_at'],
+                name='job_queue_status_run_at'
+            ),
+            models.Index(
+                fields=['idempotency_key'],
+                name='job_idempotency_key'
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['idempotency_key'],
+                condition=models.Q(status__in=('queued', 'running')),
+                name='job_active_idempotency_key'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.pk} - {self.status}'
@@ -0,0 +1,73 @@
+from threading import local
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+registry = {}
+running = local()
+
+
+def task(name=None, queue='default', max_attempts=3):
+    """ Регистрация функции как фоновой задачи.
+
+    Функция получает аргументы из payload задачи, результат
+    сохраняется в Job.result и должен сериализоваться в JSON.
+    """
+
+    def decorator(func):
+        func.task_name = name or f'{func.__module__}.{func.__name__}'
+        func.queue = queue
+        func.max_attempts = max_attempts
+
+        def enqueue_task(payload=None, **options):
+            return enqueue(func.task_name, payload, **options)
+
+        func.enqueue = enqueue_task
+        registry[func.task_name] = func
+        return func
+
+    return decorator
+
+
+def get_backend():
+    """ Бэкенд очереди из настроек."""
+
+    return import_string(settings.JOBS_BACKEND)()
+
+
+def enqueue(name, payload=None, *, queue=None, user=None,
+            idempotency_key=None, run_at=None, max_attempts=None):
+    """ Постановка задачи в очередь.
+
+    Повторный вызов с тем же idempotency_key вернет ждущую или
+    выполняемую задачу, завершенная не мешает поставить новую.
+    """
+
+    func = registry[name]
+    return get_backend().enqueue(
+        name=name,
+        payload=payload or {},
+        queue=queue or func.queue,
+        user=user,
+        idempotency_key=idempotency_key,
+        run_at=run_at,
+        max_attempts=max_attempts or func.max_attempts,
+    )
+
+
+def report(result):
+    """ Промежуточный результат выполняемой задачи в Job.result.
+
+    Заодно продлевает locked_at, чтобы долгую задачу не вернули
+    в очередь как задачу упавшего воркера.
+    """
+
+    job = getattr(running, 'job', None)
+    if job is not None:
+        Job.objects.filter(pk=job.pk).update(
+            result=result,
+            locked_at=timezone.now()
+        )
@@ -1,52 +1,81 @@
 from django.contrib import admin
 from django.contrib.admin import TabularInline, display
+from django.db.models import Count, OuterRef, Subquery
 
-from .models import (Ingredient, IngredientToRecipe, Recipe, RecipesCart,
-                     RecipeToTag, SelectedRecipe, Tag)
+from backend.admin import LargeTableAdmin, TombstoneAdmin
+
+from .models import (FeedItem, Ingredient, IngredientToRecipe, Recipe,
+                     RecipesCart, RecipeToTag, SelectedRecipe, Tag)
+from .purge import tombstone_recipes
 
 admin.site.site_header = 'foodgram'
 
 
 class IngredientToRecipeInline(TabularInline):
     model = IngredientToRecipe
+    autocomplete_fields = ('ingredient',)
     extra = 1
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            'recipe', 'ingredient'
+        )
+
 
 class TagToRecipeInline(admin.StackedInline):
     model = RecipeToTag
     extra = 1
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('recipe', 'tag')
+
 
-class SelectedAdmin(admin.ModelAdmin):
+class SelectedAdmin(LargeTableAdmin):
     list_display = (
         'user',
         'recipe',
     )
-    empty_value_display = '-пусто-'
+    list_select_related = ('user', 'recipe')
+    raw_id_fields = ('user', 'recipe')
 
 
-class IngredientsAdmin(admin.ModelAdmin):
+class IngredientsAdmin(LargeTableAdmin):
     list_display = (
         'name',
         'measurement_unit',
+        'calories',
+        'price',
     )
-    list_filter = ('name', )
-    empty_value_display = '-пусто-'
+    search_fields = ('name__startswith',)
 
 
-class RecipesAdmin(admin.ModelAdmin):
+class RecipesAdmin(TombstoneAdmin):
     inlines = [IngredientToRecipeInline, TagToRecipeInline]
     list_display = (
         'name',
         'author',
         'selected_amount'
     )
-    list_filter = ('author', 'name', 'tags')
-    empty_value_display = '-пусто-'
-
-    @display(description='в избранном!')
+    list_filter = ('tags',)
+    list_select_related = ('author',)
+    autocomplete_fields = ('author',)
+    search_fields = ('name__startswith',)
+    tombstone = staticmethod(tombstone_recipes)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            selected=Subquery(
+                SelectedRecipe.objects.filter(
+                    recipe=OuterRef('pk')
+                ).values('recipe').annotate(
+                    total=Count('pk')
+                ).values('total')
+            )
+        )
+
+    @display(description='в избранном!', ordering='selected')
     def selected_amount(self, obj):
-        return obj.recipeselect.count()
+        return obj.selected or 0
 
 
 class TagsAdmin(admin.ModelAdmin):
@@ -59,29 +88,42 @@ class TagsAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
 
 
-class IngredientToRecipeAdmin(admin.ModelAdmin):
+class IngredientToRecipeAdmin(LargeTableAdmin):
     list_display = (
         'recipe',
         'ingredient',
         'amount',
     )
-    empty_value_display = '-пусто-'
+    list_select_related = ('recipe', 'ingredient')
+    raw_id_fields = ('recipe', 'ingredient')
 
 
-class TagToRecipesAdmin(admin.ModelAdmin):
+class TagToRecipesAdmin(LargeTableAdmin):
     list_display = (
         'recipe',
         'tag',
     )
-    empty_value_display = '-пусто-'
+    list_select_related = ('recipe', 'tag')
+    raw_id_fields = ('recipe',)
 
 
-class RecipesCartAdmin(admin.ModelAdmin):
+class RecipesCartAdmin(LargeTableAdmin):
     list_display = (
         'user',
         'recipe',
     )
-    empty_value_display = '-пусто-'
+    list_select_related = ('user', 'recipe')
+    raw_id_fields = ('user', 'recipe')
+
+
+class FeedItemAdmin(LargeTableAdmin):
+    list_display = (
+        'user',
+        'author',
+        'recipe',
+    )
+    list_select_related = ('user', 'author', 'recipe')
+    raw_id_fields = ('user', 'author', 'recipe')
 
 
 admin.site.register(Tag, TagsAdmin)
@@ -91,3 +133,4 @@ admin.site.register(IngredientToRecipe, IngredientToRecipeAdmin)
 admin.site.register(RecipeToTag, TagToRecipesAdmin)
 admin.site.register(SelectedRecipe, SelectedAdmin)
 admin.site.register(RecipesCart, RecipesCartAdmin)
+admin.site.register(FeedItem, FeedItemAdmin)
@@ -0,0 +1,92 @@
+import time
+
+from asgiref.local import Local
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+
+from .models import Recipe, Tag
+
+TAGS_VERSION_KEY = 'tags:version'
+
+pending = Local()
+
+
+def recipe_fragment_key(recipe):
+    return f'recipe:{recipe.id}:{recipe.version}'
+
+
+def bump_pending():
+    ids = getattr(pending, 'ids', None)
+    if ids:
+        pending.ids = set()
+        Recipe.objects.filter(pk__in=ids).update(version=F('version') + 1)
+
+
+def touch_recipes(ids):
+    """ Новая версия рецептов после коммита, старые фрагменты не читаются.
+
+    Несколько изменений одной транзакции дают одно обновление версии.
+    """
+
+    if not hasattr(pending, 'ids'):
+        pending.ids = set()
+    pending.ids.update(ids)
+    transaction.on_commit(bump_pending)
+
+
+class TagCatalogue:
+    """ Таблица тегов в памяти процесса.
+
+    Версия каталога лежит в общем кеше и увеличивается сигналами Tag,
+    поэтому проверка свежести не ходит в базу. Таймаут ограничивает
+    устаревание, если кеш у каждого процесса свой.
+    """
+
+    def __init__(self):
+        self.version = None
+        self.loaded = 0
+        self.tags = []
+        self.by_id = {}
+        self.by_slug = {}
+
+    def refresh(self):
+        version = cache.get(TAGS_VERSION_KEY, 0)
+        if (
+            version != self.version
+            or time.monotonic() - self.loaded > settings.TAGS_CACHE_TIMEOUT
+        ):
+            self.tags = [
+                {
+                    'id': tag.id,
+                    'name': tag.name,
+                    'color': tag.color,
+                    'slug': tag.slug,
+                }
+                for tag in Tag.objects.all()
+            ]
+            self.by_id = {tag['id']: tag for tag in self.tags}
+            self.by_slug = {tag['slug']: tag for tag in self.tags}
+            self.version = version
+            self.loaded = time.monotonic()
+        return self
+
+    def lookup(self, ids):
+        """ Теги по id, при промахе каталог перечитывается один раз."""
+
+        by_id = self.refresh().by_id
+        if not by_id.keys() >= set(ids):
+            self.version = None
+            by_id = self.refresh().by_id
+        return by_id
+
+    def invalidate(self):
+        try:
+            cache.incr(TAGS_VERSION_KEY)
+        except ValueError:
+            cache.set(TAGS_VERSION_KEY, 1, None)
+        self.version = None
+
+
+tag_catalogue = TagCatalogue()
@@ -0,0 +1,129 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+
+from .models import ChangeLog
+
+NUMBER = (
+    'UPDATE {table} SET seq = numbered.seq FROM ('
+    'SELECT id, %s + ROW_NUMBER() OVER (ORDER BY id) AS seq FROM {table} '
+    'WHERE seq IS NULL ORDER BY id LIMIT %s) AS numbered '
+    'WHERE {table}.id = numbered.id'
+)
+
+
+def log_changes(kind, action, object_ids, user_id=None):
+    """ Запись в журнал изменений в текущей транзакции."""
+
+    ChangeLog.objects.bulk_create(
+        ChangeLog(
+            kind=kind, action=action, object_id=object_id, user_id=user_id
+        )
+        for object_id in object_ids
+    )
+
+
+def lock_numbering(cursor):
+    """ Нумерует один процесс за раз, остальные не ждут и читают уже
+    выданные номера. SQLite и так пропускает одного писателя.
+    """
+
+    if connection.vendor != 'postgresql':
+        return True
+    cursor.execute(
+        'SELECT pg_try_advisory_xact_lock(hashtext(%s))', ['changelog:seq']
+    )
+    return cursor.fetchone()[0]
+
+
+def assign_sequence():
+    """ Номера seq для закоммиченных записей журнала.
+
+    Запись видна здесь только после коммита своей транзакции, поэтому
+    изменения долгой транзакции получают номера больше уже выданных
+    и курсор клиента их не обгоняет.
+    """
+
+    table = connection.ops.quote_name(ChangeLog._meta.db_table)
+    batch_size = settings.SYNC_NUMBER_BATCH
+    with transaction.atomic(using='default'), connection.cursor() as cursor:
+        if not lock_numbering(cursor):
+            return
+        numbered = batch_size
+        while numbered == batch_size:
+            cursor.execute(f'SELECT COALESCE(MAX(seq), 0) FROM {table}')
+            last = cursor.fetchone()[0]
+            cursor.execute(NUMBER.format(table=table), [last, batch_size])
+            numbered = cursor.rowcount
+
+
+def current_cursor():
+    """ Курсор для клиента, который только что загрузил все данные."""
+
+    assign_sequence()
+    return ChangeLog.objects.aggregate(cursor=Max('seq'))['cursor'] or 0
+
+
+def cursor_expired(since):
+    """ Записи после курсора уже удалены по сроку хранения."""
+
+    oldest = ChangeLog.objects.aggregate(oldest=Min('seq'))['oldest']
+    return oldest is not None and since + 1 < oldest
+
+
+def prune_changes():
+    """ Удаление записей старше SYNC_RETENTION_DAYS пачками.
+
+    Последняя запись остается, по ней видно, что старые курсоры
+    устарели.
+    """
+
+    before = timezone.now() - timedelta(days=settings.SYNC_RETENTION_DAYS)
+    newest = ChangeLog.objects.aggregate(newest=Max('seq'))['newest']
+    if newest is None:
+        return 0
+    expired = ChangeLog.objects.filter(seq__lt=newest, created__lt=before)
+    deleted = 0
+    while True:
+        batch = list(expired.values_list('pk', flat=True)[
+            :settings.SYNC_NUMBER_BATCH
+        ])
+        if not batch:
+            return deleted
+        deleted += ChangeLog.objects.filter(pk__in=batch).delete()[0]
+
+
+def changes_since(user, since):
+    """ Итоговые изменения после курсора: по каждому объекту последнее.
+
+    Возвращает курсор, изменения по видам и признак, что есть еще.
+    """
+
+    assign_sequence()
+    rows = list(ChangeLog.objects.filter(
+        Q(user__isnull=True) | Q(user=user),
+        seq__gt=since
+    ).order_by('seq').values_list(
+        'seq', 'kind', 'action', 'object_id'
+    )[:settings.SYNC_LIMIT + 1])
+    more = len(rows) > settings.SYNC_LIMIT
+    rows = rows[:settings.SYNC_LIMIT]
+    latest = defaultdict(dict)
+    for seq, kind, action, object_id in rows:
+        latest[kind][object_id] = action
+    changes = {
+        kind: {
+            action: sorted(
+                object_id for object_id, last in objects.items()
+                if last == action
+            )
+            for action in (ChangeLog.UPSERT, ChangeLog.DELETE)
+        }
+        for kind, objects in latest.items()
+    }
+    cursor = rows[-1][0] if rows else since
+    return cursor, changes, more
@@ -0,0 +1,84 @@
+import atexit
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.db import DatabaseError, connection, connections
+
+from .models import Recipe, RecipeStats
+
+UPSERT = (
+    'WITH hits (id, views) AS (VALUES {values}) '
+    'INSERT INTO {stats} (recipe_id, views) '
+    'SELECT hits.id, hits.views FROM hits '
+    'JOIN {recipes} ON {recipes}.id = hits.id WHERE true '
+    'ON CONFLICT (recipe_id) DO UPDATE '
+    'SET views = {stats}.views + excluded.views'
+)
+
+
+class ViewCounter:
+    """ Буфер просмотров в памяти процесса с отложенной записью.
+
+    Просмотры копятся в Counter и раз в VIEWS_FLUSH_INTERVAL секунд
+    (или при VIEWS_FLUSH_SIZE рецептов в буфере) пишутся одним
+    INSERT ... ON CONFLICT. При падении процесса теряется не больше
+    одного интервала, при штатной остановке буфер сбрасывается.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buffer = Counter()
+        self.timer = None
+
+    def hit(self, recipe_id):
+        with self.lock:
+            self.buffer[recipe_id] += 1
+            full = len(self.buffer) >= settings.VIEWS_FLUSH_SIZE
+            if self.timer is None and not full:
+                self.timer = threading.Timer(
+                    settings.VIEWS_FLUSH_INTERVAL, self.flush_in_thread
+                )
+                self.timer.daemon = True
+                self.timer.start()
+        if full:
+            self.flush()
+
+    def take(self):
+        with self.lock:
+            buffer, self.buffer = self.buffer, Counter()
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+        return buffer
+
+    def flush(self):
+        """ Запись буфера одной пачкой, возвращает число рецептов."""
+
+        buffer = self.take()
+        if not buffer:
+            return 0
+        query = UPSERT.format(
+            values=', '.join(['(%s, %s)'] * len(buffer)),
+            stats=connection.ops.quote_name(RecipeStats._meta.db_table),
+            recipes=connection.ops.quote_name(Recipe._meta.db_table),
+        )
+        params = [value for item in buffer.items() for value in item]
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(query, params)
+        except DatabaseError:
+            with self.lock:
+                self.buffer.update(buffer)
+            raise
+        return len(buffer)
+
+    def flush_in_thread(self):
+        try:
+            self.flush()
+        finally:
+            connections.close_all()
+
+
+view_counter = ViewCounter()
+atexit.register(view_counter.flush)
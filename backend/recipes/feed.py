@@ -0,0 +1,141 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+
+from users.models import Subscribe
+
+from .models import FeedItem, Recipe
+
+CELEBRITIES_KEY = 'feed:celebrities'
+
+
+def celebrity_ids():
+    """ Авторы, чьи рецепты не раскладываются по лентам подписчиков."""
+
+    def followed_authors():
+        return frozenset(
+            Subscribe.objects.values('author').annotate(
+                followers=Count('id')
+            ).filter(
+                followers__gt=settings.FEED_FANOUT_LIMIT
+            ).values_list('author', flat=True)
+        )
+
+    return cache.get_or_set(
+        CELEBRITIES_KEY,
+        followed_authors,
+        settings.FEED_CELEBRITIES_TIMEOUT
+    )
+
+
+def deliver(items, **lookup):
+    """ Запись в ленты тех строк, которых там еще нет.
+
+    Возвращает число реально добавленных: bulk_create с
+    ignore_conflicts возвращает все переданные объекты.
+    """
+
+    present = set(FeedItem.objects.filter(**lookup).values_list(
+        'user_id', 'recipe_id'
+    ))
+    missing = [
+        item for item in items
+        if (item.user_id, item.recipe_id) not in present
+    ]
+    FeedItem.objects.bulk_create(missing, ignore_conflicts=True)
+    return len(missing)
+
+
+def fan_out(recipe):
+    """ Запись нового рецепта в ленты подписчиков автора."""
+
+    if recipe.author_id in celebrity_ids():
+        return 0
+    followers = Subscribe.objects.filter(
+        author_id=recipe.author_id
+    ).values_list('user_id', flat=True).iterator(
+        chunk_size=settings.FEED_BATCH_SIZE
+    )
+    delivered = 0
+    batch = []
+    for user_id in followers:
+        batch.append(FeedItem(
+            user_id=user_id,
+            author_id=recipe.author_id,
+            recipe_id=recipe.id
+        ))
+        if len(batch) == settings.FEED_BATCH_SIZE:
+            delivered += deliver(
+                batch,
+                recipe_id=recipe.id,
+                user_id__in=[item.user_id for item in batch]
+            )
+            batch = []
+    delivered += deliver(
+        batch,
+        recipe_id=recipe.id,
+        user_id__in=[item.user_id for item in batch]
+    )
+    return delivered
+
+
+@transaction.atomic
+def backfill(user_id, author_id):
+    """ Последние рецепты автора в ленту нового подписчика.
+
+    Подписка блокируется до конца транзакции: если юзер успел
+    отписаться, лента не заполняется, а отписка ждет коммита и
+    удаляет уже записанное.
+    """
+
+    if author_id in celebrity_ids():
+        return 0
+    if not Subscribe.objects.select_for_update().filter(
+        user_id=user_id, author_id=author_id
+    ).exists():
+        return 0
+    recipes = Recipe.objects.filter(author_id=author_id).order_by(
+        '-id'
+    ).values_list('id', flat=True)[:settings.FEED_BACKFILL]
+    return deliver(
+        [
+            FeedItem(user_id=user_id, author_id=author_id, recipe_id=pk)
+            for pk in recipes
+        ],
+        user_id=user_id,
+        author_id=author_id
+    )
+
+
+def feed_recipe_ids(user, before=None, limit=6):
+    """ Id рецептов ленты, новые первыми, строго меньше курсора.
+
+    Основной источник - материализованная лента, авторы с огромным
+    числом подписчиков дочитываются из Recipe при чтении.
+    """
+
+    items = FeedItem.objects.filter(user=user)
+    if before is not None:
+        items = items.filter(recipe_id__lt=before)
+    ids = list(
+        items.order_by('-recipe_id').values_list('recipe_id', flat=True)[
+            :limit
+        ]
+    )
+    celebrities = celebrity_ids()
+    if not celebrities:
+        return ids
+    authors = list(Subscribe.objects.filter(
+        user=user,
+        author_id__in=celebrities
+    ).values_list('author_id', flat=True))
+    if not authors:
+        return ids
+    recipes = Recipe.objects.filter(author_id__in=authors)
+    if before is not None:
+        recipes = recipes.filter(id__lt=before)
+    ids.extend(
+        recipes.order_by('-id').values_list('id', flat=True)[:limit]
+    )
+    return sorted(set(ids), reverse=True)[:limit]
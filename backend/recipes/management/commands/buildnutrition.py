@@ -0,0 +1,15 @@
+from django.core.management import BaseCommand
+
+from recipes import nutrition
+
+
+class Command(BaseCommand):
+    """ Полный пересчет калорийности и стоимости рецептов."""
+
+    help = 'суммы калорий и цен ингридиентов по всем рецептам'
+
+    def handle(self, *args, **kwargs):
+        count = nutrition.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'калорийность и стоимость посчитаны для {count} рецептов'
+        ))
@@ -0,0 +1,15 @@
+from django.core.management import BaseCommand
+
+from recipes import similarity
+
+
+class Command(BaseCommand):
+    """ Полный пересчет похожих рецептов."""
+
+    help = 'TF-IDF векторы ингридиентов и косинусная близость рецептов'
+
+    def handle(self, *args, **kwargs):
+        count = similarity.build()
+        self.stdout.write(self.style.SUCCESS(
+            f'похожие рецепты посчитаны для {count} рецептов'
+        ))
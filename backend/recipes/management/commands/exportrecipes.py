@@ -0,0 +1,149 @@
+import json
+import os
+import shutil
+from itertools import islice
+from multiprocessing import Pool
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management import BaseCommand
+from django.db.models import Prefetch, prefetch_related_objects
+
+from recipes.models import IngredientToRecipe, Recipe
+
+
+def copy_file(paths):
+    """ Копирование файла, уже скопированные пропускаются."""
+
+    source, target = paths
+    if (
+        os.path.exists(target)
+        and os.path.getsize(target) == os.path.getsize(source)
+    ):
+        return False
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    shutil.copyfile(source, target)
+    return True
+
+
+def read_checkpoint(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def write_checkpoint(path, data):
+    temp = f'{path}.tmp'
+    with open(temp, 'w', encoding='utf-8') as file:
+        json.dump(data, file)
+    os.replace(temp, path)
+
+
+def dump_recipe(recipe):
+    author = recipe.author
+    return {
+        'id': recipe.id,
+        'name': recipe.name,
+        'text': recipe.text,
+        'cooking_time': recipe.cooking_time,
+        'pub_date': recipe.pub_date.isoformat(),
+        'image': recipe.image.name or None,
+        'author': {
+            'email': author.email,
+            'username': author.username,
+            'first_name': author.first_name,
+            'last_name': author.last_name,
+        },
+        'tags': [
+            {'name': tag.name, 'color': tag.color, 'slug': tag.slug}
+            for tag in recipe.tags.all()
+        ],
+        'ingredients': [
+            {
+                'name': item.ingredient.name,
+                'measurement_unit': item.ingredient.measurement_unit,
+                'amount': item.amount,
+            }
+            for item in recipe.recipe.all()
+        ],
+    }
+
+
+class Command(BaseCommand):
+    """ Экспорт рецептов в NDJSON."""
+
+    help = 'потоковая выгрузка рецептов с тегами, ингридиентами и фото'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output',
+            default=f'{settings.BASE_DIR}/data/recipes.ndjson'
+        )
+        parser.add_argument(
+            '--media-dir',
+            help='куда копировать фото, по умолчанию <output>_media'
+        )
+        parser.add_argument('--chunk-size', type=int, default=500)
+        parser.add_argument('--jobs', type=int, default=os.cpu_count())
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            help='продолжить с контрольной точки'
+        )
+
+    def handle(self, *args, **options):
+        output = options['output']
+        media_dir = options['media_dir'] or f'{output}_media'
+        checkpoint_path = f'{output}.checkpoint'
+        checkpoint = (
+            read_checkpoint(checkpoint_path) if options['resume'] else None
+        ) or {'last_id': 0, 'offset': 0, 'count': 0}
+        recipes = Recipe.objects.filter(
+            id__gt=checkpoint['last_id']
+        ).select_related('author').order_by('id').iterator(
+            chunk_size=options['chunk_size']
+        )
+        mode = 'r+b' if options['resume'] and os.path.exists(output) else 'wb'
+        with open(output, mode) as file, Pool(options['jobs']) as pool:
+            file.seek(checkpoint['offset'])
+            file.truncate()
+            while True:
+                chunk = list(islice(recipes, options['chunk_size']))
+                if not chunk:
+                    break
+                prefetch_related_objects(
+                    chunk,
+                    'tags',
+                    Prefetch(
+                        'recipe',
+                        queryset=IngredientToRecipe.objects.select_related(
+                            'ingredient'
+                        )
+                    )
+                )
+                images = []
+                for recipe in chunk:
+                    data = dump_recipe(recipe)
+                    file.write(
+                        json.dumps(data, ensure_ascii=False).encode() + b'\n'
+                    )
+                    if data['image']:
+                        images.append((
+                            default_storage.path(data['image']),
+                            os.path.join(media_dir, data['image'])
+                        ))
+                for _ in pool.imap_unordered(copy_file, images):
+                    pass
+                file.flush()
+                os.fsync(file.fileno())
+                checkpoint = {
+                    'last_id': chunk[-1].id,
+                    'offset': file.tell(),
+                    'count': checkpoint['count'] + len(chunk),
+                }
+                write_checkpoint(checkpoint_path, checkpoint)
+                self.stdout.write(f'выгружено {checkpoint["count"]} рецептов')
+        self.stdout.write(self.style.SUCCESS(
+            f'экспорт в {output} завершен'
+        ))
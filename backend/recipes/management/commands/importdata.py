@@ -3,6 +3,7 @@ import csv
 from django.conf import settings
 from django.core.management import BaseCommand
 from recipes.models import Ingredient
+from recipes.snapshots import schedule_snapshot
 
 FILE_LIST = {
     Ingredient: 'ingredients.csv',
@@ -28,4 +29,5 @@ class Command(BaseCommand):
                     )
                 except Exception as error:
                     print(f'файл {filename} невозможно импортировать. ', error)
+        schedule_snapshot('ingredients')
         self.stdout.write(self.style.SUCCESS('импорт файлов успешно завершен'))
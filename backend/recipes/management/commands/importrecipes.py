@@ -0,0 +1,226 @@
+import json
+import os
+from datetime import date
+from itertools import islice
+from multiprocessing import Pool
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.management import BaseCommand
+from django.db import connection, transaction
+
+from recipes.changes import log_changes
+from recipes.management.commands.exportrecipes import (copy_file,
+                                                       read_checkpoint,
+                                                       write_checkpoint)
+from recipes.models import (ChangeLog, Ingredient, IngredientToRecipe, Recipe,
+                            RecipeToTag, Tag)
+from recipes.tasks import fan_out_recipe, update_nutrition
+
+User = get_user_model()
+
+
+def read_lines(file, offset):
+    """ Строки файла вместе со смещением конца строки.
+
+    Файл открыт в двоичном режиме, смещение считается по длине строк
+    без file.tell() на каждой строке.
+    """
+
+    for line in file:
+        offset += len(line)
+        if line.strip():
+            yield json.loads(line), offset
+
+
+def schedule_jobs(ids):
+    """ Раскладка по лентам и пересчет калорийности рецептов пачки.
+
+    bulk_create не шлет сигналы, поэтому задачи ставятся здесь.
+    """
+
+    for recipe_id in ids:
+        fan_out_recipe.enqueue({'recipe_id': recipe_id})
+    if ids:
+        update_nutrition.enqueue({'recipe_ids': ids})
+
+
+class Command(BaseCommand):
+    """ Импорт рецептов из NDJSON, выгруженного exportrecipes."""
+
+    help = 'потоковая загрузка рецептов с тегами, ингридиентами и фото'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--input',
+            default=f'{settings.BASE_DIR}/data/recipes.ndjson'
+        )
+        parser.add_argument(
+            '--media-dir',
+            help='откуда брать фото, по умолчанию <input>_media'
+        )
+        parser.add_argument('--chunk-size', type=int, default=500)
+        parser.add_argument('--jobs', type=int, default=os.cpu_count())
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            help='продолжить с контрольной точки'
+        )
+
+    def get_authors(self, rows):
+        """ Авторы пачки по email, недостающие создаются без пароля.
+
+        Если username занят юзером с другим email или автор удален,
+        его рецепты пропускаются с предупреждением.
+        """
+
+        authors = {row['author']['email']: row['author'] for row in rows}
+        found = {
+            user.email: user
+            for user in User.all_objects.filter(email__in=authors)
+        }
+        taken = dict(User.all_objects.filter(username__in={
+            data['username'] for data in authors.values()
+        }).values_list('username', 'email'))
+        usable = {}
+        for email, data in authors.items():
+            user = found.get(email)
+            if user is None and data['username'] not in taken:
+                user = User(**data)
+                user.set_unusable_password()
+                user.save()
+                taken[user.username] = email
+            if user is None or user.deleted_at is not None:
+                if email not in self.conflicts:
+                    self.conflicts.add(email)
+                    self.stderr.write(
+                        f'автор {email} пропущен: username '
+                        f'{data["username"]} занят или автор удален'
+                    )
+                continue
+            usable[email] = user
+        return usable
+
+    def get_tags(self, rows):
+        tags = {
+            tag['slug']: tag for row in rows for tag in row['tags']
+        }
+        found = {tag.slug: tag for tag in Tag.objects.filter(slug__in=tags)}
+        for slug, data in tags.items():
+            if slug not in found:
+                found[slug] = Tag.objects.create(**data)
+        return found
+
+    def get_ingredients(self, rows):
+        if self.ingredients is None:
+            self.ingredients = {
+                (item.name, item.measurement_unit): item.id
+                for item in Ingredient.objects.all()
+            }
+        missing = {
+            (item['name'], item['measurement_unit'])
+            for row in rows for item in row['ingredients']
+        } - self.ingredients.keys()
+        for name, unit in missing:
+            self.ingredients[(name, unit)] = Ingredient.objects.create(
+                name=name,
+                measurement_unit=unit
+            ).id
+        return self.ingredients
+
+    @transaction.atomic
+    def save_chunk(self, rows):
+        """ Запись пачки рецептов, уже существующие пропускаются."""
+
+        authors = self.get_authors(rows)
+        rows = [row for row in rows if row['author']['email'] in authors]
+        tags = self.get_tags(rows)
+        ingredients = self.get_ingredients(rows)
+        existing = set(Recipe.objects.filter(
+            author__in=authors.values(),
+            name__in={row['name'] for row in rows}
+        ).values_list('author__email', 'name'))
+        rows = list({
+            (row['author']['email'], row['name']): row for row in rows
+            if (row['author']['email'], row['name']) not in existing
+        }.values())
+        recipes = [
+            Recipe(
+                author=authors[row['author']['email']],
+                name=row['name'],
+                text=row['text'],
+                cooking_time=row['cooking_time'],
+                image=row['image'] or '',
+            )
+            for row in rows
+        ]
+        if connection.features.can_return_rows_from_bulk_insert:
+            Recipe.objects.bulk_create(recipes)
+            ids = [recipe.id for recipe in recipes]
+            log_changes(ChangeLog.RECIPE, ChangeLog.UPSERT, ids)
+            transaction.on_commit(lambda: schedule_jobs(ids))
+        else:
+            for recipe in recipes:
+                recipe.save()
+        for recipe, row in zip(recipes, rows):
+            recipe.pub_date = date.fromisoformat(row['pub_date'])
+        Recipe.objects.bulk_update(recipes, ('pub_date',))
+        RecipeToTag.objects.bulk_create(
+            RecipeToTag(recipe=recipe, tag=tags[tag['slug']])
+            for recipe, row in zip(recipes, rows)
+            for tag in row['tags']
+        )
+        IngredientToRecipe.objects.bulk_create(
+            IngredientToRecipe(
+                recipe=recipe,
+                ingredient_id=ingredients[
+                    (item['name'], item['measurement_unit'])
+                ],
+                amount=item['amount']
+            )
+            for recipe, row in zip(recipes, rows)
+            for item in row['ingredients']
+        )
+        return len(recipes)
+
+    def handle(self, *args, **options):
+        source = options['input']
+        media_dir = options['media_dir'] or f'{source}_media'
+        checkpoint_path = f'{source}.import-checkpoint'
+        checkpoint = (
+            read_checkpoint(checkpoint_path) if options['resume'] else None
+        ) or {'offset': 0, 'count': 0, 'created': 0}
+        self.ingredients = None
+        self.conflicts = set()
+        with open(source, 'rb') as file, Pool(options['jobs']) as pool:
+            file.seek(checkpoint['offset'])
+            lines = read_lines(file, checkpoint['offset'])
+            while True:
+                chunk = list(islice(lines, options['chunk_size']))
+                if not chunk:
+                    break
+                rows = [row for row, _ in chunk]
+                for _ in pool.imap_unordered(copy_file, [
+                    (
+                        os.path.join(media_dir, row['image']),
+                        default_storage.path(row['image'])
+                    )
+                    for row in rows if row['image']
+                ]):
+                    pass
+                checkpoint = {
+                    'offset': chunk[-1][1],
+                    'count': checkpoint['count'] + len(rows),
+                    'created': checkpoint['created'] + self.save_chunk(rows),
+                }
+                write_checkpoint(checkpoint_path, checkpoint)
+                self.stdout.write(
+                    f'обработано {checkpoint["count"]}, '
+                    f'создано {checkpoint["created"]} рецептов'
+                )
+        self.stdout.write(self.style.SUCCESS(
+            f'импорт из {source} завершен, ленты подписчиков и калорийность '
+            f'обновят фоновые задачи (runjobs), похожие рецепты пересчитает '
+            f'buildsimilar'
+        ))
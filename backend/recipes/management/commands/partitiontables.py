@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+
+from backend.partitions import partition_table, partitioned_models
+
+
+class Command(BaseCommand):
+    """ Перевод таблиц избранного, корзины и подписок на хеш-секции."""
+
+    help = ('онлайн-перенос избранного, корзины и подписок в таблицы, '
+            'секционированные по user_id (только Postgres)')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--partitions', type=int, default=settings.PARTITIONS
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.PARTITION_BATCH_SIZE
+        )
+
+    def progress(self, done, total):
+        self.stdout.write(f'  {done}/{total}')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('секционирование доступно только в Postgres')
+        for model in partitioned_models():
+            table = model._meta.db_table
+            self.stdout.write(f'{table}:')
+            try:
+                changed = partition_table(
+                    table,
+                    options['partitions'],
+                    options['batch_size'],
+                    self.progress
+                )
+            except ValueError as error:
+                raise CommandError(error)
+            self.stdout.write(self.style.SUCCESS(
+                f'{table}: секционирована' if changed
+                else f'{table}: уже секционирована'
+            ))
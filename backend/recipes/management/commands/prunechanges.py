@@ -0,0 +1,13 @@
+from django.core.management import BaseCommand
+
+from recipes.tasks import prune_changes
+
+
+class Command(BaseCommand):
+    """ Запуск очистки журнала синхронизации."""
+
+    help = 'удаление старых записей журнала, дальше задача повторяется сама'
+
+    def handle(self, *args, **kwargs):
+        job = prune_changes.enqueue({})
+        self.stdout.write(self.style.SUCCESS(f'задача {job} поставлена'))
@@ -0,0 +1,13 @@
+from django.core.management import BaseCommand
+
+from recipes.tasks import prune_exports
+
+
+class Command(BaseCommand):
+    """ Запуск очистки каталога выгрузок."""
+
+    help = 'удаление старых выгрузок, дальше задача повторяется сама'
+
+    def handle(self, *args, **kwargs):
+        job = prune_exports.enqueue({})
+        self.stdout.write(self.style.SUCCESS(f'задача {job} поставлена'))
@@ -0,0 +1,22 @@
+from django.core.management import BaseCommand, CommandError
+
+from recipes.snapshots import CATALOGUES, publish_all
+
+
+class Command(BaseCommand):
+    """ Публикация снимков каталогов тегов и ингридиентов."""
+
+    help = 'запись JSON-снимков тегов и ингридиентов для отдачи через nginx'
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*')
+
+    def handle(self, *args, **options):
+        unknown = set(options['names']) - set(CATALOGUES)
+        if unknown:
+            raise CommandError(
+                f'нет каталогов: {", ".join(sorted(unknown))}, '
+                f'есть: {", ".join(CATALOGUES)}'
+            )
+        for name, url in publish_all(options['names']).items():
+            self.stdout.write(self.style.SUCCESS(f'{name}: {url}'))
@@ -0,0 +1,17 @@
+from django.core.management import BaseCommand
+from django.utils import timezone
+
+from recipes.tasks import rank_recipes, rank_slot
+
+
+class Command(BaseCommand):
+    """ Запуск пересчета рейтингов популярности."""
+
+    help = 'полный пересчет рейтингов, дальше задача повторяется сама'
+
+    def handle(self, *args, **kwargs):
+        job = rank_recipes.enqueue(
+            {'since': None},
+            idempotency_key=f'rank_recipes:{rank_slot(timezone.now())}'
+        )
+        self.stdout.write(self.style.SUCCESS(f'задача {job} поставлена'))
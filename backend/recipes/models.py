@@ -1,7 +1,13 @@
+import hashlib
+from pathlib import PurePath
+
 from django.contrib.auth import get_user_model
 from django.core.validators import (MaxValueValidator, MinValueValidator,
                                     RegexValidator)
 from django.db import models
+from django.db.models.fields.files import ImageFieldFile
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 
 User = get_user_model()
 
@@ -51,12 +57,27 @@ class Ingredient(models.Model):
 
     name = models.CharField(
         verbose_name='ингридиент',
-        max_length=100
+        max_length=100,
+        db_index=True
     )
     measurement_unit = models.CharField(
         verbose_name='единица измерения ингредиента',
         max_length=30
     )
+    calories = models.FloatField(
+        verbose_name='калорийность',
+        default=0,
+        validators=[MinValueValidator(0)],
+        help_text='ккал на единицу измерения'
+    )
+    price = models.DecimalField(
+        verbose_name='цена',
+        max_digits=12,
+        decimal_places=4,
+        default=0,
+        validators=[MinValueValidator(0)],
+        help_text='рублей за единицу измерения'
+    )
 
     class Meta:
         ordering = ('name',)
@@ -67,6 +88,41 @@ class Ingredient(models.Model):
         return f'{self.name} - {self.measurement_unit}.'
 
 
+class HashedImageFieldFile(ImageFieldFile):
+
+    def save(self, name, content, save=True):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        suffix = PurePath(name).suffix.lower()
+        super().save(f'{digest.hexdigest()[:32]}{suffix}', content, save)
+
+
+class HashedImageField(models.ImageField):
+    """ Картинка с именем по хешу содержимого.
+
+    /media/ кешируется как неизменяемый, новая картинка всегда
+    получает новый адрес.
+    """
+
+    attr_class = HashedImageFieldFile
+
+
+class RecipeQuerySet(models.QuerySet):
+
+    def with_views(self):
+        """ Число просмотров из RecipeStats, 0 без записи."""
+
+        return self.annotate(views=Coalesce('stats__views', 0))
+
+
+class RecipeManager(models.Manager.from_queryset(RecipeQuerySet)):
+    """ Рецепты без удаленных, ждущих фоновой очистки."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
 class Recipe(models.Model):
     """ Модель рецептов."""
 
@@ -79,8 +135,9 @@ class Recipe(models.Model):
     name = models.CharField(
         verbose_name='название шедевра',
         max_length=100,
+        db_index=True,
     )
-    image = models.ImageField(
+    image = HashedImageField(
         verbose_name='как выглядит блюдо',
         upload_to='recipes/images/',
         default=None,
@@ -119,6 +176,21 @@ class Recipe(models.Model):
         verbose_name='дата публикации рецепта',
         auto_now_add=True
     )
+    version = models.PositiveIntegerField(
+        verbose_name='версия для кеша',
+        default=1,
+        editable=False
+    )
+    deleted_at = models.DateTimeField(
+        verbose_name='удален',
+        null=True,
+        blank=True,
+        editable=False,
+        db_index=True
+    )
+
+    objects = RecipeManager()
+    all_objects = RecipeQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'рецепт'
@@ -128,6 +200,25 @@ class Recipe(models.Model):
     def __str__(self):
         return f'{self.name}'
 
+    def save(self, *args, **kwargs):
+        """ Запись без version и deleted_at.
+
+        Их меняют только UPDATE из touch_recipes и tombstone_recipes,
+        запись объекта, прочитанного раньше, не должна вернуть старые
+        значения.
+        """
+
+        if not self._state.adding and not kwargs.get('force_insert'):
+            fields = kwargs.get('update_fields') or [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+            ]
+            kwargs['update_fields'] = [
+                name for name in fields
+                if name not in ('version', 'deleted_at')
+            ]
+        super().save(*args, **kwargs)
+
 
 class IngredientToRecipe(models.Model):
     """ Модель ингридиентов в рецептах."""
@@ -203,6 +294,11 @@ class SelectedRecipe(models.Model):
         related_name='recipeselect',
         verbose_name='избранные',
     )
+    created = models.DateTimeField(
+        verbose_name='добавлен',
+        default=timezone.now,
+        db_index=True
+    )
 
     class Meta:
         verbose_name = 'избранный'
@@ -234,10 +330,276 @@ class RecipesCart(models.Model):
         related_name='listrecipe',
         verbose_name='рецепт'
     )
+    created = models.DateTimeField(
+        verbose_name='добавлен',
+        default=timezone.now,
+        db_index=True
+    )
 
     class Meta:
         verbose_name = 'корзина'
         verbose_name_plural = 'корзины'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_cart_recipe'
+            )
+        ]
 
     def __str__(self):
         return f'{self.recipe.name} - {self.user}'
+
+
+class FeedItem(models.Model):
+    """ Рецепт в ленте подписчика."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed',
+        verbose_name='подписчик'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='автор'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feeditems',
+        verbose_name='рецепт'
+    )
+
+    class Meta:
+        verbose_name = 'рецепт в ленте'
+        verbose_name_plural = 'лента подписок'
+        ordering = ('-recipe',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_feed_recipe'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user} - {self.recipe}'
+
+
+class RecipeRank(models.Model):
+    """ Рейтинг популярности рецепта, общий и по тегам."""
+
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='ranks',
+        verbose_name='рецепт'
+    )
+    tag = models.ForeignKey(
+        Tag,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='тег',
+        null=True,
+        blank=True
+    )
+    score = models.FloatField(
+        verbose_name='рейтинг',
+        default=0
+    )
+
+    class Meta:
+        verbose_name = 'рейтинг рецепта'
+        verbose_name_plural = 'рейтинги рецептов'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'tag'],
+                name='unique_rank_recipe_tag'
+            ),
+            models.UniqueConstraint(
+                fields=['recipe'],
+                condition=models.Q(tag__isnull=True),
+                name='unique_rank_recipe'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['tag', '-score'], name='rank_tag_score'),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe} - {self.tag} - {self.score:.3f}'
+
+
+class RecipeNeighbours(models.Model):
+    """ Похожие рецепты, посчитанные заранее."""
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='neighbours',
+        verbose_name='рецепт'
+    )
+    similar = models.JSONField(
+        verbose_name='похожие рецепты',
+        default=list,
+        help_text='пары [id рецепта, косинусная близость] по убыванию'
+    )
+
+    class Meta:
+        verbose_name = 'похожие рецепты'
+        verbose_name_plural = 'похожие рецепты'
+
+    def __str__(self):
+        return f'{self.recipe_id} - {len(self.similar)}'
+
+
+class IngredientWeight(models.Model):
+    """ Вес IDF ингридиента с последнего полного пересчета похожих."""
+
+    ingredient = models.OneToOneField(
+        Ingredient,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='weight',
+        verbose_name='ингридиент'
+    )
+    idf = models.FloatField(verbose_name='вес IDF')
+
+    class Meta:
+        verbose_name = 'вес ингридиента'
+        verbose_name_plural = 'веса ингридиентов'
+
+    def __str__(self):
+        return f'{self.ingredient_id} - {self.idf}'
+
+
+class RecipeNutrition(models.Model):
+    """ Калорийность и стоимость рецепта, посчитанные заранее."""
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='nutrition',
+        verbose_name='рецепт'
+    )
+    calories = models.FloatField(
+        verbose_name='калорийность',
+        default=0
+    )
+    price = models.DecimalField(
+        verbose_name='стоимость',
+        max_digits=14,
+        decimal_places=2,
+        default=0
+    )
+    updated = models.DateTimeField(
+        verbose_name='пересчитано',
+        auto_now=True
+    )
+
+    class Meta:
+        verbose_name = 'калорийность и стоимость'
+        verbose_name_plural = 'калорийность и стоимость'
+
+    def __str__(self):
+        return f'{self.recipe_id} - {self.calories} ккал, {self.price} руб.'
+
+
+class ChangeLog(models.Model):
+    """ Журнал изменений для синхронизации клиентов, только добавление.
+
+    Изменения рецептов общие (user пустой), избранное, корзина и
+    подписки пишутся с юзером. seq выдается после коммита, в порядке
+    появления записей, поэтому курсор не обгоняет долгие транзакции.
+    """
+
+    RECIPE = 'recipe'
+    FAVORITE = 'favorite'
+    CART = 'cart'
+    SUBSCRIPTION = 'subscription'
+    KINDS = (
+        (RECIPE, 'рецепт'),
+        (FAVORITE, 'избранное'),
+        (CART, 'корзина'),
+        (SUBSCRIPTION, 'подписка'),
+    )
+    UPSERT = 'upsert'
+    DELETE = 'delete'
+    ACTIONS = (
+        (UPSERT, 'добавлен или изменен'),
+        (DELETE, 'удален'),
+    )
+
+    seq = models.BigIntegerField(
+        verbose_name='номер в порядке коммита',
+        null=True,
+        blank=True,
+        unique=True,
+        editable=False
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='юзер',
+        null=True,
+        blank=True
+    )
+    kind = models.CharField(
+        verbose_name='объект',
+        max_length=16,
+        choices=KINDS
+    )
+    action = models.CharField(
+        verbose_name='действие',
+        max_length=8,
+        choices=ACTIONS
+    )
+    object_id = models.BigIntegerField(
+        verbose_name='id рецепта или автора'
+    )
+    created = models.DateTimeField(
+        verbose_name='время',
+        default=timezone.now,
+        db_index=True
+    )
+
+    class Meta:
+        ordering = ('id',)
+        verbose_name = 'изменение'
+        verbose_name_plural = 'журнал изменений'
+        indexes = [
+            models.Index(fields=['user', 'seq'], name='changelog_user_seq'),
+        ]
+
+    def __str__(self):
+        return f'{self.seq} {self.kind} {self.action} {self.object_id}'
+
+
+class RecipeStats(models.Model):
+    """ Счетчики рецепта, пишутся пачками из буфера процессов."""
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='рецепт'
+    )
+    views = models.BigIntegerField(
+        verbose_name='просмотры',
+        default=0
+    )
+
+    class Meta:
+        verbose_name = 'статистика рецепта'
+        verbose_name_plural = 'статистика рецептов'
+        indexes = [
+            models.Index(fields=['-views'], name='stats_views'),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe_id} - {self.views}'
@@ -0,0 +1,84 @@
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from scipy import sparse
+
+from .models import Ingredient, IngredientToRecipe, Recipe, RecipeNutrition
+
+
+def ingredient_table():
+    """ Id ингридиентов по возрастанию и столбцы [калории, цена]."""
+
+    table = np.array(
+        Ingredient.objects.order_by('pk').values_list(
+            'pk', 'calories', 'price'
+        ),
+        dtype=np.float64
+    ).reshape(-1, 3)
+    return table[:, 0].astype(np.int64), table[:, 1:]
+
+
+def totals(recipe_ids, table):
+    """ Суммы по рецептам: разреженная матрица количеств на таблицу."""
+
+    ingredient_ids, values = table
+    links = np.array(
+        IngredientToRecipe.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('recipe_id', 'ingredient_id', 'amount'),
+        dtype=np.int64
+    ).reshape(-1, 3)
+    recipes = np.asarray(sorted(recipe_ids), dtype=np.int64)
+    matrix = sparse.csr_matrix(
+        (
+            links[:, 2].astype(np.float64),
+            (
+                np.searchsorted(recipes, links[:, 0]),
+                np.searchsorted(ingredient_ids, links[:, 1])
+            )
+        ),
+        shape=(len(recipes), len(ingredient_ids))
+    )
+    return recipes, matrix @ values
+
+
+def store(recipes, sums):
+    with transaction.atomic():
+        RecipeNutrition.objects.filter(pk__in=recipes.tolist()).delete()
+        RecipeNutrition.objects.bulk_create(
+            RecipeNutrition(
+                recipe_id=int(recipe_id),
+                calories=round(float(calories), 1),
+                price=Decimal(f'{price:.2f}')
+            )
+            for recipe_id, (calories, price) in zip(recipes, sums)
+        )
+
+
+def update(recipe_ids, table=None):
+    """ Пересчет калорийности и стоимости рецептов пачками."""
+
+    table = table or ingredient_table()
+    recipe_ids = sorted(set(Recipe.objects.filter(
+        pk__in=list(recipe_ids)
+    ).values_list('pk', flat=True)))
+    size = settings.NUTRITION_BATCH_SIZE
+    for start in range(0, len(recipe_ids), size):
+        store(*totals(recipe_ids[start:start + size], table))
+    return len(recipe_ids)
+
+
+def update_ingredient(ingredient_id):
+    """ Пересчет рецептов с измененным ингридиентом."""
+
+    return update(IngredientToRecipe.objects.filter(
+        ingredient_id=ingredient_id
+    ).values_list('recipe_id', flat=True).distinct())
+
+
+def rebuild():
+    """ Полный пересчет всех рецептов."""
+
+    return update(Recipe.objects.values_list('pk', flat=True))
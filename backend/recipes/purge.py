@@ -0,0 +1,106 @@
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import models, transaction
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from jobs.queue import report
+
+from .changes import log_changes
+from .models import ChangeLog, Recipe
+from .tasks import purge_objects
+
+User = get_user_model()
+
+
+def schedule_purge(model, ids):
+    label = model._meta.label_lower
+    transaction.on_commit(lambda: purge_objects.enqueue(
+        {'model': label, 'ids': ids}
+    ))
+
+
+@transaction.atomic
+def tombstone_recipes(ids):
+    """ Скрыть рецепты сразу, зависимые записи удалит фоновая задача."""
+
+    ids = list(Recipe.objects.filter(pk__in=ids).values_list('pk', flat=True))
+    Recipe.objects.filter(pk__in=ids).update(deleted_at=timezone.now())
+    log_changes(ChangeLog.RECIPE, ChangeLog.DELETE, ids)
+    schedule_purge(Recipe, ids)
+    return ids
+
+
+@transaction.atomic
+def tombstone_users(ids):
+    """ Скрыть юзеров вместе с их рецептами и закрыть им вход.
+
+    Токены удаляются сразу, остальное удалит фоновая задача.
+    """
+
+    now = timezone.now()
+    ids = list(User.objects.filter(pk__in=ids).values_list('pk', flat=True))
+    User.objects.filter(pk__in=ids).update(deleted_at=now, is_active=False)
+    Token.objects.filter(user_id__in=ids).delete()
+    recipes = list(Recipe.objects.filter(
+        author_id__in=ids
+    ).values_list('pk', flat=True))
+    Recipe.objects.filter(pk__in=recipes).update(deleted_at=now)
+    log_changes(ChangeLog.RECIPE, ChangeLog.DELETE, recipes)
+    schedule_purge(User, ids)
+    return ids
+
+
+def purge_related(model, ids, deleted):
+    """ Удаление зависимых записей пачками, от листьев к корню.
+
+    Для каждой связи с CASCADE берется пачка id, сначала чистятся ее
+    собственные зависимые, затем строки удаляются одним DELETE без
+    загрузки объектов и сигналов. SET_NULL обнуляется UPDATE пачками.
+    """
+
+    batch_size = settings.PURGE_BATCH_SIZE
+    for relation in model._meta.related_objects:
+        if relation.many_to_many or relation.on_delete not in (
+            models.CASCADE, models.SET_NULL
+        ):
+            continue
+        related = relation.related_model
+        dependents = related._base_manager.filter(
+            **{f'{relation.field.name}__in': ids}
+        )
+        while True:
+            batch = list(dependents.values_list('pk', flat=True)[:batch_size])
+            if not batch:
+                break
+            rows = related._base_manager.filter(pk__in=batch)
+            if relation.on_delete is models.SET_NULL:
+                rows.update(**{relation.field.name: None})
+                continue
+            purge_related(related, batch, deleted)
+            deleted[related._meta.label_lower] += rows._raw_delete(rows.db)
+            report({'deleted': dict(deleted), 'done': False})
+
+
+def purge(model, ids):
+    """ Удаление скрытых объектов и всех зависимых записей.
+
+    Сами объекты удаляются обычным delete() после очистки больших
+    связей, чтобы сработали сигналы и удалились мелкие связи без
+    отдельных моделей (группы, права).
+    """
+
+    deleted = Counter()
+    batch_size = settings.PURGE_BATCH_SIZE
+    for start in range(0, len(ids), batch_size):
+        batch = list(model._base_manager.filter(
+            pk__in=ids[start:start + batch_size],
+            deleted_at__isnull=False
+        ).values_list('pk', flat=True))
+        purge_related(model, batch, deleted)
+        model._base_manager.filter(pk__in=batch).delete()
+        deleted[model._meta.label_lower] += len(batch)
+        report({'deleted': dict(deleted), 'done': False})
+    return {'deleted': dict(deleted), 'done': True}
@@ -0,0 +1,138 @@
+import math
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import (Recipe, RecipeRank, RecipesCart, RecipeToTag,
+                     SelectedRecipe)
+
+EPOCH = datetime(2023, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def logaddexp(first, second):
+    """ log(exp(a) + exp(b)) без переполнения."""
+
+    if first < second:
+        first, second = second, first
+    if second == -math.inf:
+        return first
+    return first + math.log1p(math.exp(second - first))
+
+
+def event_weight(created, weight):
+    """ Вклад события в log-пространстве.
+
+    Рейтинг хранится как log(1 + sum(w * exp(lambda * (t - EPOCH)))).
+    Сдвиг на EPOCH вместо текущего времени сохраняет порядок рецептов,
+    поэтому старые рейтинги не нужно пересчитывать при затухании.
+    """
+
+    decay = math.log(2) / (settings.TRENDING_HALF_LIFE_HOURS * 3600)
+    return decay * (created - EPOCH).total_seconds() + math.log(weight)
+
+
+def collect_events(since=None, until=None):
+    """ Сумма вкладов событий по рецептам в log-пространстве."""
+
+    totals = defaultdict(lambda: -math.inf)
+    sources = (
+        (SelectedRecipe, settings.TRENDING_FAVORITE_WEIGHT),
+        (RecipesCart, settings.TRENDING_CART_WEIGHT),
+    )
+    for model, weight in sources:
+        events = model.objects.all()
+        if since is not None:
+            events = events.filter(created__gt=since)
+        if until is not None:
+            events = events.filter(created__lte=until)
+        for recipe_id, created in events.values_list(
+            'recipe_id', 'created'
+        ).iterator(chunk_size=settings.TRENDING_BATCH_SIZE):
+            totals[recipe_id] = logaddexp(
+                totals[recipe_id],
+                event_weight(created, weight)
+            )
+    return totals
+
+
+def recipe_tags(recipe_ids):
+    tags = defaultdict(list)
+    for recipe_id, tag_id in RecipeToTag.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values_list('recipe_id', 'tag_id'):
+        tags[recipe_id].append(tag_id)
+    return tags
+
+
+def rebuild():
+    """ Полный пересчет рейтингов, учитывает и удаленные события.
+
+    Возвращает отметку времени, до которой учтены события.
+    """
+
+    until = timezone.now() - timedelta(seconds=settings.TRENDING_SETTLE)
+    totals = collect_events(until=until)
+    recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+    tags = recipe_tags(recipe_ids)
+    ranks = []
+    for recipe_id in recipe_ids:
+        score = logaddexp(0, totals.get(recipe_id, -math.inf))
+        ranks.append(RecipeRank(recipe_id=recipe_id, score=score))
+        ranks.extend(
+            RecipeRank(recipe_id=recipe_id, tag_id=tag_id, score=score)
+            for tag_id in tags[recipe_id]
+        )
+    with transaction.atomic():
+        RecipeRank.objects.all().delete()
+        RecipeRank.objects.bulk_create(
+            ranks,
+            batch_size=settings.TRENDING_BATCH_SIZE
+        )
+    return until
+
+
+def update(since):
+    """ Инкрементальное обновление по событиям после отметки since."""
+
+    until = timezone.now() - timedelta(seconds=settings.TRENDING_SETTLE)
+    totals = collect_events(since=since, until=until)
+    totals.update(
+        (recipe_id, -math.inf)
+        for recipe_id in Recipe.objects.filter(
+            ranks__isnull=True
+        ).values_list('id', flat=True)
+        if recipe_id not in totals
+    )
+    tags = recipe_tags(totals)
+    existing = {
+        (rank.recipe_id, rank.tag_id): rank
+        for rank in RecipeRank.objects.filter(recipe_id__in=totals)
+    }
+    changed = []
+    created = []
+    for recipe_id, delta in totals.items():
+        for tag_id in [None, *tags[recipe_id]]:
+            rank = existing.get((recipe_id, tag_id))
+            if rank is None:
+                created.append(RecipeRank(
+                    recipe_id=recipe_id,
+                    tag_id=tag_id,
+                    score=logaddexp(0, delta)
+                ))
+            elif delta != -math.inf:
+                rank.score = logaddexp(rank.score, delta)
+                changed.append(rank)
+    with transaction.atomic():
+        RecipeRank.objects.bulk_update(
+            changed, ('score',),
+            batch_size=settings.TRENDING_BATCH_SIZE
+        )
+        RecipeRank.objects.bulk_create(
+            created,
+            batch_size=settings.TRENDING_BATCH_SIZE,
+            ignore_conflicts=True
+        )
+    return until
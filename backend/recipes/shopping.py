@@ -0,0 +1,81 @@
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+
+from .models import IngredientToRecipe, RecipeNutrition
+
+CART_HEADER = 'Что нужно купить:\n\n'
+
+UNITS = {
+    'кг': ('г', 1000),
+    'л': ('мл', 1000),
+    'ст. л.': ('мл', 15),
+    'ч. л.': ('мл', 5),
+    'стакан': ('мл', 250),
+}
+
+
+def canonical_unit(field='ingredient__measurement_unit'):
+    """ Базовая единица измерения по таблице UNITS, в SQL."""
+
+    return Case(
+        *(
+            When(**{field: unit}, then=Value(base))
+            for unit, (base, factor) in UNITS.items()
+        ),
+        default=F(field)
+    )
+
+
+def canonical_amount(field='ingredient__measurement_unit'):
+    """ Количество в базовой единице, в SQL."""
+
+    return F('amount') * Case(
+        *(
+            When(**{field: unit}, then=Value(factor))
+            for unit, (base, factor) in UNITS.items()
+        ),
+        default=Value(1),
+        output_field=IntegerField()
+    )
+
+
+def cart_ingredients(user):
+    """ Сумма ингридиентов из корзины юзера в базовых единицах.
+
+    Один сгруппированный запрос, сортировка на стороне базы.
+    """
+
+    return IngredientToRecipe.objects.filter(
+        recipe__listrecipe__user=user,
+        recipe__deleted_at__isnull=True
+    ).values(
+        name=F('ingredient__name'),
+        measurement_unit=canonical_unit()
+    ).annotate(
+        amount=Sum(canonical_amount())
+    ).order_by('name', 'measurement_unit')
+
+
+def cart_totals(user):
+    """ Калорийность и стоимость корзины по посчитанным рецептам."""
+
+    return RecipeNutrition.objects.filter(
+        recipe__listrecipe__user=user,
+        recipe__deleted_at__isnull=True
+    ).aggregate(calories=Sum('calories'), price=Sum('price'))
+
+
+def render_cart(ingredients, totals=None):
+    """ Текст списка покупок."""
+
+    cartlist = CART_HEADER + '\n'.join([
+        f'{ingredient["name"]}'
+        f' - {ingredient["amount"]}'
+        f' {ingredient["measurement_unit"]}.'
+        for ingredient in ingredients
+    ])
+    if totals and totals['calories'] is not None:
+        cartlist += (
+            f'\n\nИтого: {totals["calories"]:.0f} ккал,'
+            f' {totals["price"]:.2f} руб.'
+        )
+    return cartlist
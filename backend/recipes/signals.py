@@ -0,0 +1,191 @@
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_save)
+from django.dispatch import receiver
+
+from users.models import Subscribe, User
+
+from .caches import tag_catalogue, touch_recipes
+from .changes import log_changes
+from .models import (ChangeLog, FeedItem, Ingredient, IngredientToRecipe,
+                     Recipe, RecipesCart, RecipeToTag, SelectedRecipe, Tag)
+from .snapshots import schedule_snapshot
+from .tasks import (backfill_feed, fan_out_recipe, update_nutrition,
+                    update_similar)
+
+AUTHOR_FIELDS = {'email', 'username', 'first_name', 'last_name'}
+INGREDIENT_FIELDS = ('name', 'measurement_unit')
+NUTRITION_FIELDS = ('calories', 'price')
+
+
+def schedule_recipe_jobs(recipe_id, created):
+    """ Фоновые задачи после записи рецепта, для bulk-записи тоже."""
+
+    if created:
+        transaction.on_commit(
+            lambda: fan_out_recipe.enqueue({'recipe_id': recipe_id})
+        )
+    transaction.on_commit(
+        lambda: update_similar.enqueue({'recipe_id': recipe_id})
+    )
+    transaction.on_commit(
+        lambda: update_nutrition.enqueue({'recipe_ids': [recipe_id]})
+    )
+
+
+def recipes_changed(ids):
+    """ Новая версия рецептов для кеша и запись в журнал изменений."""
+
+    ids = list(ids)
+    touch_recipes(ids)
+    log_changes(ChangeLog.RECIPE, ChangeLog.UPSERT, ids)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_published(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        schedule_recipe_jobs(instance.id, created)
+    if created:
+        log_changes(ChangeLog.RECIPE, ChangeLog.UPSERT, [instance.id])
+    else:
+        recipes_changed([instance.id])
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    if instance.deleted_at is None:
+        log_changes(ChangeLog.RECIPE, ChangeLog.DELETE, [instance.id])
+
+
+@receiver(post_save, sender=SelectedRecipe)
+@receiver(post_save, sender=RecipesCart)
+def recipe_marked(sender, instance, created, **kwargs):
+    if created:
+        log_changes(
+            ChangeLog.FAVORITE if sender is SelectedRecipe else ChangeLog.CART,
+            ChangeLog.UPSERT,
+            [instance.recipe_id],
+            instance.user_id
+        )
+
+
+@receiver(post_delete, sender=SelectedRecipe)
+@receiver(post_delete, sender=RecipesCart)
+def recipe_unmarked(sender, instance, **kwargs):
+    log_changes(
+        ChangeLog.FAVORITE if sender is SelectedRecipe else ChangeLog.CART,
+        ChangeLog.DELETE,
+        [instance.recipe_id],
+        instance.user_id
+    )
+
+
+@receiver(post_save, sender=IngredientToRecipe)
+@receiver(post_delete, sender=IngredientToRecipe)
+@receiver(post_save, sender=RecipeToTag)
+@receiver(post_delete, sender=RecipeToTag)
+def recipe_link_changed(sender, instance, **kwargs):
+    recipes_changed([instance.recipe_id])
+
+
+@receiver(m2m_changed, sender=IngredientToRecipe)
+@receiver(m2m_changed, sender=RecipeToTag)
+def recipe_links_changed(sender, instance, action, reverse, pk_set,
+                         **kwargs):
+    if not reverse:
+        if action.startswith('post_'):
+            recipes_changed([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        recipes_changed(pk_set)
+    elif action == 'pre_clear':
+        recipes_changed(
+            sender.objects.filter(**{
+                'ingredient' if sender is IngredientToRecipe else 'tag':
+                instance
+            }).values_list('recipe_id', flat=True)
+        )
+
+
+@receiver(pre_save, sender=Ingredient)
+def ingredient_saving(sender, instance, update_fields=None, **kwargs):
+    """ Поля ингридиента до записи: новая версия рецептов нужна только
+    при смене названия или единицы, пересчет - калорийности или цены.
+    """
+
+    fields = [
+        name for name in INGREDIENT_FIELDS + NUTRITION_FIELDS
+        if not update_fields or name in update_fields
+    ]
+    instance.saved_fields = {}
+    if instance.pk is None or not fields:
+        return
+    instance.saved_fields = Ingredient.objects.filter(
+        pk=instance.pk
+    ).values(*fields).first() or {}
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_changed(sender, instance, created, **kwargs):
+    if created:
+        return
+    changed = {
+        name for name, value in instance.saved_fields.items()
+        if getattr(instance, name) != value
+    }
+    if changed & set(INGREDIENT_FIELDS):
+        recipes_changed(instance.ingredienttorecipe.values_list(
+            'recipe_id', flat=True
+        ))
+    if changed & set(NUTRITION_FIELDS):
+        transaction.on_commit(lambda: update_nutrition.enqueue(
+            {'ingredient_id': instance.id}
+        ))
+
+
+@receiver(post_save, sender=User)
+def author_changed(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields and not AUTHOR_FIELDS & set(update_fields)):
+        return
+    recipes_changed(instance.recipes.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Subscribe)
+def subscribed(sender, instance, created, **kwargs):
+    if created:
+        log_changes(
+            ChangeLog.SUBSCRIPTION,
+            ChangeLog.UPSERT,
+            [instance.author_id],
+            instance.user_id
+        )
+        transaction.on_commit(lambda: backfill_feed.enqueue({
+            'user_id': instance.user_id,
+            'author_id': instance.author_id,
+        }))
+
+
+@receiver(post_delete, sender=Subscribe)
+def unsubscribed(sender, instance, **kwargs):
+    log_changes(
+        ChangeLog.SUBSCRIPTION,
+        ChangeLog.DELETE,
+        [instance.author_id],
+        instance.user_id
+    )
+    FeedItem.objects.filter(
+        user_id=instance.user_id,
+        author_id=instance.author_id
+    ).delete()
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tags_changed(sender, **kwargs):
+    tag_catalogue.invalidate()
+    schedule_snapshot('tags')
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredients_changed(sender, **kwargs):
+    schedule_snapshot('ingredients')
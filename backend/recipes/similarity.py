@@ -0,0 +1,181 @@
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from scipy import sparse
+
+from .models import IngredientToRecipe, IngredientWeight, RecipeNeighbours
+
+
+def computed_weights(ingredient_ids, columns, recipes):
+    """ IDF по всем рецептам, как при полном пересчете."""
+
+    frequency = np.bincount(columns, minlength=len(ingredient_ids))
+    return np.log((1 + recipes) / (1 + frequency)) + 1
+
+
+def stored_weights(ingredient_ids, columns, recipes):
+    """ IDF с последнего полного пересчета.
+
+    Ингридиенты, добавленные позже, получают вес самого редкого.
+    """
+
+    weights = dict(IngredientWeight.objects.filter(
+        ingredient_id__in=ingredient_ids.tolist()
+    ).values_list('ingredient_id', 'idf'))
+    default = max(weights.values(), default=1.0)
+    return np.array(
+        [weights.get(int(pk), default) for pk in ingredient_ids]
+    )
+
+
+def load_vectors(pairs, weights):
+    """ TF-IDF векторы рецептов по парам (рецепт, ингридиент).
+
+    Строки матрицы нормированы, поэтому произведение строк -
+    косинусная близость.
+    """
+
+    pairs = np.array(pairs, dtype=np.int64).reshape(-1, 2)
+    recipe_ids, rows = np.unique(pairs[:, 0], return_inverse=True)
+    ingredient_ids, columns = np.unique(pairs[:, 1], return_inverse=True)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(pairs), dtype=np.float32), (rows, columns)),
+        shape=(len(recipe_ids), len(ingredient_ids))
+    )
+    matrix.data[:] = 1
+    idf = weights(ingredient_ids, columns, len(recipe_ids))
+    matrix = matrix @ sparse.diags(idf.astype(np.float32))
+    norms = np.sqrt(matrix.multiply(matrix).sum(axis=1)).A1
+    norms[norms == 0] = 1
+    matrix = sparse.diags(1 / norms) @ matrix
+    return recipe_ids, ingredient_ids, idf, matrix.tocsr()
+
+
+def top_neighbours(scores, recipe_ids, own_index, limit):
+    """ Список [id, близость] лучших соседей строки."""
+
+    scores[own_index] = 0
+    count = min(limit, np.count_nonzero(scores))
+    if not count:
+        return []
+    best = np.argpartition(-scores, count - 1)[:count]
+    best = best[np.argsort(-scores[best], kind='stable')]
+    return [
+        [int(recipe_ids[index]), round(float(scores[index]), 4)]
+        for index in best
+    ]
+
+
+def build():
+    """ Полный пересчет соседей всех рецептов блоками строк.
+
+    Веса IDF сохраняются, по ним считаются векторы в update().
+    """
+
+    recipe_ids, ingredient_ids, idf, matrix = load_vectors(
+        IngredientToRecipe.objects.values_list('recipe_id', 'ingredient_id'),
+        computed_weights
+    )
+    limit = settings.SIMILAR_RECIPES
+    transposed = matrix.T.tocsc()
+    block = max(1, settings.SIMILAR_BLOCK_CELLS // max(1, len(recipe_ids)))
+    with transaction.atomic():
+        IngredientWeight.objects.all().delete()
+        IngredientWeight.objects.bulk_create(
+            IngredientWeight(ingredient_id=int(pk), idf=float(weight))
+            for pk, weight in zip(ingredient_ids, idf)
+        )
+        RecipeNeighbours.objects.all().delete()
+        for start in range(0, len(recipe_ids), block):
+            scores = (matrix[start:start + block] @ transposed).toarray()
+            RecipeNeighbours.objects.bulk_create(
+                RecipeNeighbours(
+                    recipe_id=int(recipe_ids[start + offset]),
+                    similar=top_neighbours(
+                        row, recipe_ids, start + offset, limit
+                    )
+                )
+                for offset, row in enumerate(scores)
+            )
+    return len(recipe_ids)
+
+
+def containing(recipe_id):
+    """ Списки соседей, в которых есть рецепт."""
+
+    if connection.features.supports_json_field_contains:
+        return Q(similar__contains=[[recipe_id]])
+    return Q(similar__icontains=f'[{recipe_id},')
+
+
+def candidate_scores(recipe_id):
+    """ Похожие рецепта и близость к нему рецептов с общими ингридиентами.
+
+    Векторизуются только эти рецепты и с сохраненными весами, поэтому
+    близости сравнимы с посчитанными в build().
+    """
+
+    shared = IngredientToRecipe.objects.filter(
+        ingredient_id__in=IngredientToRecipe.objects.filter(
+            recipe_id=recipe_id
+        ).values('ingredient_id')
+    ).values('recipe_id')
+    recipe_ids, _, _, matrix = load_vectors(
+        IngredientToRecipe.objects.filter(recipe_id__in=shared).values_list(
+            'recipe_id', 'ingredient_id'
+        ),
+        stored_weights
+    )
+    position = np.searchsorted(recipe_ids, recipe_id)
+    if position == len(recipe_ids) or recipe_ids[position] != recipe_id:
+        return None, {}
+    limit = settings.SIMILAR_RECIPES
+    scores = (matrix[position] @ matrix.T).toarray().ravel()
+    similar = top_neighbours(scores, recipe_ids, position, limit)
+    candidates = {
+        item[0]: item[1] for item in top_neighbours(
+            scores, recipe_ids, position,
+            limit * settings.SIMILAR_CANDIDATES_FACTOR
+        )
+    }
+    return similar, candidates
+
+
+def update(recipe_id):
+    """ Соседи нового или измененного рецепта.
+
+    Рецепт убирается из всех списков соседей и снова попадает в те,
+    где он ближе последнего. Удаленный рецепт только убирается.
+    Освободившиеся места заполнит следующий полный пересчет.
+    """
+
+    similar, candidates = candidate_scores(recipe_id)
+    limit = settings.SIMILAR_RECIPES
+    changed = []
+    with transaction.atomic():
+        for neighbours in RecipeNeighbours.objects.select_for_update(
+        ).filter(
+            Q(recipe_id__in=candidates) | containing(recipe_id)
+        ).exclude(recipe_id=recipe_id):
+            others = [
+                item for item in neighbours.similar if item[0] != recipe_id
+            ]
+            score = candidates.get(neighbours.recipe_id)
+            if score is not None and (
+                len(others) < limit or score > others[-1][1]
+            ):
+                others.append([recipe_id, score])
+                others.sort(key=lambda item: -item[1])
+            if others[:limit] != neighbours.similar:
+                neighbours.similar = others[:limit]
+                changed.append(neighbours)
+        RecipeNeighbours.objects.bulk_update(changed, ('similar',))
+        if similar is None:
+            RecipeNeighbours.objects.filter(recipe_id=recipe_id).delete()
+        else:
+            RecipeNeighbours.objects.update_or_create(
+                recipe_id=recipe_id,
+                defaults={'similar': similar}
+            )
+    return len(changed)
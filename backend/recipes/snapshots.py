@@ -0,0 +1,112 @@
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Ingredient, Tag
+from .tasks import publish_snapshots
+
+CATALOGUES = {
+    'tags': lambda: Tag.objects.values('id', 'name', 'color', 'slug'),
+    'ingredients': lambda: Ingredient.objects.values(
+        'id', 'name', 'measurement_unit'
+    ),
+}
+
+
+def write_atomic(path, content):
+    descriptor, temporary = tempfile.mkstemp(dir=path.parent)
+    with os.fdopen(descriptor, 'wb') as file:
+        file.write(content)
+    os.chmod(temporary, 0o644)
+    os.replace(temporary, path)
+
+
+def render(name):
+    """ Тело ответа списка как у API: компактный JSON без \\u-экранов."""
+
+    return json.dumps(
+        list(CATALOGUES[name]()),
+        ensure_ascii=False,
+        separators=(',', ':')
+    ).encode()
+
+
+def prune(root, name, keep):
+    """ Удаление старых версий, последние keep остаются для клиентов,
+    которые еще качают предыдущий снимок.
+    """
+
+    versions = sorted(
+        root.glob(f'{name}.*.json'),
+        key=lambda path: path.stat().st_mtime,
+        reverse=True
+    )
+    for path in versions[keep:]:
+        path.unlink(missing_ok=True)
+        Path(f'{path}.gz').unlink(missing_ok=True)
+
+
+def publish(name):
+    """ Запись снимка каталога с версией по хешу содержимого.
+
+    Версионный файл неизменяем, {name}.json всегда указывает на
+    текущую версию. Рядом лежат .gz для gzip_static в nginx.
+    """
+
+    root = Path(settings.SNAPSHOTS_ROOT)
+    root.mkdir(parents=True, exist_ok=True)
+    body = render(name)
+    version = hashlib.sha1(body).hexdigest()[:12]
+    compressed = gzip.compress(body, compresslevel=9, mtime=0)
+    versioned = root / f'{name}.{version}.json'
+    if versioned.exists():
+        versioned.touch()
+    else:
+        write_atomic(Path(f'{versioned}.gz'), compressed)
+        write_atomic(versioned, body)
+    write_atomic(root / f'{name}.json.gz', compressed)
+    write_atomic(root / f'{name}.json', body)
+    prune(root, name, settings.SNAPSHOTS_KEEP)
+    return version
+
+
+def publish_all(names=None):
+    """ Публикация снимков и манифеста с адресами текущих версий.
+
+    Манифест собирается по текущим файлам, поэтому параллельные
+    публикации разных каталогов не затирают друг друга.
+    """
+
+    for name in names or CATALOGUES:
+        publish(name)
+    root = Path(settings.SNAPSHOTS_ROOT)
+    manifest = {}
+    for name in CATALOGUES:
+        current = root / f'{name}.json'
+        if current.exists():
+            version = hashlib.sha1(current.read_bytes()).hexdigest()[:12]
+            manifest[name] = f'{settings.SNAPSHOTS_URL}{name}.{version}.json'
+    write_atomic(root / 'manifest.json', json.dumps(manifest).encode())
+    return manifest
+
+
+def schedule_snapshot(name):
+    """ Публикация после коммита, правки за SNAPSHOTS_DEBOUNCE секунд
+    собираются в одну задачу.
+    """
+
+    debounce = settings.SNAPSHOTS_DEBOUNCE
+    slot = int(time.time()) // debounce + 1
+    transaction.on_commit(lambda: publish_snapshots.enqueue(
+        {'names': [name]},
+        run_at=datetime.fromtimestamp(slot * debounce, timezone.utc),
+        idempotency_key=f'snapshots:{name}:{slot}'
+    ))
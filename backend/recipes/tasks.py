@@ -0,0 +1,158 @@
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from backend.delivery import spool_name, spool_prune, spool_write
+from jobs.queue import task
+
+from . import changes, feed, ranking
+from .models import Recipe
+from .shopping import cart_ingredients, cart_totals, render_cart
+
+User = get_user_model()
+
+
+@task(queue='exports')
+def build_shopping_cart(user_id):
+    """ Сборка файла списка покупок."""
+
+    user = User.objects.get(pk=user_id)
+    cartlist = render_cart(cart_ingredients(user), cart_totals(user))
+    return {
+        'path': spool_write(
+            spool_name(f'cart/{user_id}', '.txt'), cartlist.encode()
+        ),
+        'filename': 'cartlist.txt',
+    }
+
+
+@task()
+def fan_out_recipe(recipe_id):
+    """ Раскладка нового рецепта по лентам подписчиков."""
+
+    recipe = Recipe.objects.filter(pk=recipe_id).first()
+    if recipe is None:
+        return {'delivered': 0}
+    return {'delivered': feed.fan_out(recipe)}
+
+
+@task()
+def backfill_feed(user_id, author_id):
+    """ Заполнение ленты после подписки."""
+
+    return {'delivered': feed.backfill(user_id, author_id)}
+
+
+def rank_slot(when):
+    """ Номер интервала пересчета рейтингов для ключа идемпотентности."""
+
+    return int(when.timestamp()) // settings.TRENDING_INTERVAL
+
+
+@task()
+def rank_recipes(since=None):
+    """ Пересчет рейтингов популярности, ставит следующий запуск.
+
+    Следующий запуск ставится и после ошибки, с тем же since. Ключ
+    идемпотентности по интервалу не дает запустить две цепочки.
+    """
+
+    until = None
+    try:
+        if since is None:
+            until = ranking.rebuild()
+        else:
+            until = ranking.update(parse_datetime(since))
+        return {'until': until.isoformat()}
+    finally:
+        next_run = timezone.now() + timedelta(
+            seconds=settings.TRENDING_INTERVAL
+        )
+        slot = rank_slot(next_run)
+        if slot % settings.TRENDING_REBUILD_EVERY == 0:
+            since = None
+        elif until is not None:
+            since = until.isoformat()
+        rank_recipes.enqueue(
+            {'since': since},
+            run_at=next_run,
+            idempotency_key=f'rank_recipes:{slot}'
+        )
+
+
+@task()
+def update_similar(recipe_id):
+    """ Пересчет похожих рецептов для нового или измененного рецепта.
+
+    numpy и scipy импортируются только в воркере очереди.
+    """
+
+    from . import similarity
+    return {'updated': similarity.update(recipe_id)}
+
+
+@task()
+def update_nutrition(recipe_ids=None, ingredient_id=None):
+    """ Пересчет калорийности и стоимости рецептов."""
+
+    from . import nutrition
+    if ingredient_id is not None:
+        return {'updated': nutrition.update_ingredient(ingredient_id)}
+    return {'updated': nutrition.update(recipe_ids)}
+
+
+@task()
+def purge_objects(model, ids):
+    """ Фоновое удаление скрытых рецептов или юзеров с зависимыми.
+
+    Прогресс по таблицам пишется в Job.result после каждой пачки.
+    """
+
+    from .purge import purge
+    return purge(apps.get_model(model), ids)
+
+
+@task()
+def publish_snapshots(names=None):
+    """ Запись снимков каталогов тегов и ингридиентов для nginx."""
+
+    from .snapshots import publish_all
+    return publish_all(names)
+
+
+@task()
+def prune_changes():
+    """ Удаление старых записей журнала синхронизации, ставит следующий
+    запуск через SYNC_PRUNE_INTERVAL секунд.
+    """
+
+    try:
+        return {'deleted': changes.prune_changes()}
+    finally:
+        interval = settings.SYNC_PRUNE_INTERVAL
+        next_run = timezone.now() + timedelta(seconds=interval)
+        slot = int(next_run.timestamp()) // interval
+        prune_changes.enqueue(
+            {}, run_at=next_run, idempotency_key=f'prune_changes:{slot}'
+        )
+
+
+@task()
+def prune_exports():
+    """ Удаление старых выгрузок, ставит следующий запуск через
+    EXPORTS_PRUNE_INTERVAL секунд.
+    """
+
+    try:
+        return {'deleted': spool_prune()}
+    finally:
+        interval = settings.EXPORTS_PRUNE_INTERVAL
+        next_run = timezone.now() + timedelta(seconds=interval)
+        slot = int(next_run.timestamp()) // interval
+        prune_exports.enqueue(
+            {}, run_at=next_run, idempotency_key=f'prune_exports:{slot}'
+        )
@@ -1,17 +1,21 @@
 from django.contrib import admin
 
+from backend.admin import LargeTableAdmin, TombstoneAdmin
+from recipes.purge import tombstone_users
+
 from .models import Subscribe, User
 
 
-class SubscribeAdmin(admin.ModelAdmin):
+class SubscribeAdmin(LargeTableAdmin):
     list_display = (
         'user',
         'author',
     )
-    empty_value_display = '-пусто-'
+    list_select_related = ('user', 'author')
+    raw_id_fields = ('user', 'author')
 
 
-class UserAdmin(admin.ModelAdmin):
+class UserAdmin(TombstoneAdmin):
     list_display = (
         'pk',
         'username',
@@ -19,8 +23,9 @@ class UserAdmin(admin.ModelAdmin):
         'last_name',
         'email',
     )
-    list_filter = ('email', 'username', )
-    empty_value_display = '-пусто-'
+    list_filter = ('is_staff', 'is_active')
+    search_fields = ('email__startswith', 'username__startswith')
+    tombstone = staticmethod(tombstone_users)
 
 
 admin.site.register(User, UserAdmin)
@@ -0,0 +1,55 @@
+from contextlib import contextmanager
+from threading import BoundedSemaphore
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+slots = BoundedSemaphore(settings.HASHING_CONCURRENCY)
+
+
+class HashingBusy(Exception):
+    """ Нет свободного места для хеширования за HASHING_WAIT секунд."""
+
+
+@contextmanager
+def hashing_slot():
+    """ Место для хеширования пароля в процессе.
+
+    Одновременно хешируется не больше HASHING_CONCURRENCY паролей,
+    остальные ждут до HASHING_WAIT секунд и получают HashingBusy,
+    чтобы всплеск входов не занял все потоки воркера. Ограничивает
+    только воркеры gthread с threads больше HASHING_CONCURRENCY.
+    """
+
+    if not slots.acquire(timeout=settings.HASHING_WAIT):
+        raise HashingBusy
+    try:
+        yield
+    finally:
+        slots.release()
+
+
+class BoundedHasherMixin:
+
+    def encode(self, password, salt, *args, **kwargs):
+        with hashing_slot():
+            return super().encode(password, salt, *args, **kwargs)
+
+    def verify(self, password, encoded):
+        with hashing_slot():
+            return super().verify(password, encoded)
+
+
+class Argon2PasswordHasher(BoundedHasherMixin, hashers.Argon2PasswordHasher):
+    """ Argon2id с параметрами из настроек.
+
+    При смене параметров хеш пересчитывается при следующем входе.
+    """
+
+    time_cost = settings.ARGON2_TIME_COST
+    memory_cost = settings.ARGON2_MEMORY_COST
+    parallelism = settings.ARGON2_PARALLELISM
+
+
+class PBKDF2PasswordHasher(BoundedHasherMixin, hashers.PBKDF2PasswordHasher):
+    """ Проверка старых хешей PBKDF2 до пересчета при входе."""
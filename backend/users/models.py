@@ -1,10 +1,17 @@
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager
 from django.core.exceptions import ValidationError
 from django.db import models
 
 LIMIT_SYMBOL_NAME = 15
 
 
+class LiveUserManager(UserManager):
+    """ Юзеры без удаленных, ждущих фоновой очистки."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
 class User(AbstractUser):
     """ Модель для юзера."""
 
@@ -24,6 +31,16 @@ class User(AbstractUser):
     last_name = models.CharField(
         max_length=150
     )
+    deleted_at = models.DateTimeField(
+        verbose_name='удален',
+        null=True,
+        blank=True,
+        editable=False,
+        db_index=True
+    )
+
+    objects = LiveUserManager()
+    all_objects = UserManager()
 
     class Meta:
         ordering = ('-id',)